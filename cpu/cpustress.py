@@ -18,6 +18,10 @@
 Stress test for CPU
 """
 
+import os
+import sys
+import re
+import json
 import multiprocessing
 import platform
 from random import randint
@@ -26,6 +30,17 @@ from avocado import main
 from avocado.utils import process
 from avocado.utils import cpu
 from avocado.utils.software_manager import SoftwareManager
+# helpers shared between tests live in lib/ at the top of the tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, 'lib'))
+from kmsg_watcher import KmsgWatcher  # noqa
+from latency import latency_summary  # noqa
+
+try:
+    from time import monotonic as clock
+except ImportError:
+    # python 2 has no monotonic clock
+    from time import time as clock
 
 
 pids = []
@@ -36,10 +51,53 @@ errorlog = ['WARNING: CPU:', 'Oops',
             'rcu_sched detected stalls',
             'NMI backtrace for cpu',
             'Call Trace:']
+# (cpu, online/offline, seconds) of every cpu state change
+transitions = []
+tracing = '/sys/kernel/debug/tracing'
+
+
+def cpu_online(cpu_num):
+    """
+    Onlines the cpu and records how long the transition took
+    """
+    if cpu._get_cpu_status(cpu_num):
+        return
+    start = clock()
+    cpu.online(cpu_num)
+    transitions.append((cpu_num, 'online', clock() - start))
 
 
-def collect_dmesg(object):
-    object.whiteboard = process.system_output("dmesg")
+def cpu_offline(cpu_num):
+    """
+    Offlines the cpu and records how long the transition took
+    """
+    if not cpu._get_cpu_status(cpu_num):
+        return
+    start = clock()
+    cpu.offline(cpu_num)
+    transitions.append((cpu_num, 'offline', clock() - start))
+
+
+def cpuhp_steps(trace):
+    """
+    Pairs cpuhp_enter/cpuhp_multi_enter and cpuhp_exit trace events per
+    cpu and returns the total time in seconds spent in every hotplug step
+    """
+    steps = {}
+    pending = {}
+    for line in trace.splitlines():
+        obj = re.search(r"\s([\d.]+): cpuhp_(enter|multi_enter|exit):"
+                        r"\s+cpu: (\d+).*step:\s+(\d+)(?: \((\S+)\))?",
+                        line)
+        if not obj:
+            continue
+        stamp, event, cpu_num, step, name = obj.groups()
+        if event != 'exit':
+            pending[cpu_num] = (float(stamp), name or step)
+        elif cpu_num in pending:
+            start, name = pending.pop(cpu_num)
+            steps[name] = steps.get(name, 0) + float(stamp) - start
+    return steps
 
 
 class cpustresstest(Test):
@@ -75,20 +133,13 @@ class cpustresstest(Test):
                 self.cancel("%s is required to continue..." % pkg)
         self.iteration = int(self.params.get('iteration', default='10'))
         self.tests = self.params.get('test', default='all')
+        self.slowest = int(self.params.get('slowest', default='10'))
+        self.cpuhp_trace = self.params.get('cpuhp_trace', default=False)
+        self.kmsg = KmsgWatcher(errorlog, level=4)
+        self.kmsg.start()
 
-    @staticmethod
-    def __clear_dmesg():
-        process.run("dmesg -c", sudo=True)
-
-    @staticmethod
-    def __error_check():
-        ERROR = []
-        logs = process.system_output("dmesg -Txl 1,2,3,4").splitlines()
-        for error in errorlog:
-            for log in logs:
-                if error in log:
-                    ERROR.append(log)
-        return "\n".join(ERROR)
+    def __error_check(self):
+        return "\n".join(self.kmsg.new_hits())
 
     @staticmethod
     def __isSMT():
@@ -99,19 +150,88 @@ class cpustresstest(Test):
     @staticmethod
     def __online_cpus(cores):
         for cpus in range(cores):
-            cpu.online(cpus)
+            cpu_online(cpus)
 
     @staticmethod
     def __offline_cpus(cores):
         for cpus in range(cores):
-            cpu.offline(cpus)
+            cpu_offline(cpus)
 
     @staticmethod
     def __cpu_toggle(core):
         if cpu._get_cpu_status(core):
-            cpu.offline(core)
+            cpu_offline(core)
         else:
-            cpu.online(core)
+            cpu_online(core)
+
+    @staticmethod
+    def __core_map():
+        """
+        Maps every cpu to 'package:core', core_id alone repeats across
+        packages
+        """
+        cores = {}
+        for cpus in range(totalcpus + 1):
+            topology = "/sys/devices/system/cpu/cpu%s/topology" % cpus
+            ids = []
+            for name in ['physical_package_id', 'core_id']:
+                path = os.path.join(topology, name)
+                if os.path.exists(path):
+                    with open(path) as core_file:
+                        ids.append(core_file.read().strip())
+            if len(ids) == 2:
+                cores[cpus] = ":".join(ids)
+        return cores
+
+    def __set_cpuhp_trace(self, enable):
+        with open("%s/events/cpuhp/enable" % tracing, 'w') as event_file:
+            event_file.write("1" if enable else "0")
+        if enable:
+            # empty the trace buffer
+            open("%s/trace" % tracing, 'w').close()
+
+    def __hotplug_report(self, cores):
+        """
+        Logs and saves per cpu and per core latency distributions and the
+        slowest transitions
+        """
+        if not transitions:
+            return
+        report = {'cpu': {}, 'core': {}, 'slowest': []}
+        for key, name in [('cpu', lambda cpu_num: cpu_num),
+                          ('core', lambda cpu_num: cores.get(cpu_num, '?'))]:
+            samples = {}
+            for cpu_num, action, seconds in transitions:
+                samples.setdefault(action, {}).setdefault(
+                    name(cpu_num), []).append(seconds)
+            for action in samples:
+                report[key][action] = {}
+                for index in sorted(samples[action]):
+                    summary = latency_summary(samples[action][index],
+                                              scale=1000)
+                    report[key][action][index] = summary
+                    self.log.info("%s %s %s latency (ms): %s", key, index,
+                                  action, summary)
+        for cpu_num, action, seconds in sorted(transitions,
+                                               key=lambda item: item[2],
+                                               reverse=True)[:self.slowest]:
+            report['slowest'].append({'cpu': cpu_num, 'action': action,
+                                      'ms': round(seconds * 1000, 3)})
+            self.log.info("slow transition: cpu%s %s took %.3f ms", cpu_num,
+                          action, seconds * 1000)
+        if self.cpuhp_trace:
+            with open("%s/trace" % tracing) as trace_file:
+                steps = cpuhp_steps(trace_file.read())
+            report['cpuhp_steps_ms'] = dict([(step, round(seconds * 1000, 3))
+                                             for step, seconds in
+                                             steps.items()])
+            for step in sorted(steps, key=steps.get,
+                               reverse=True)[:self.slowest]:
+                self.log.info("cpuhp step %s: %.3f ms in total", step,
+                              steps[step] * 1000)
+        with open(os.path.join(self.outputdir, "hotplug_latency.json"),
+                  'w') as json_file:
+            json.dump(report, json_file, indent=4)
 
     @staticmethod
     def __kill_process(pids):
@@ -123,6 +243,10 @@ class cpustresstest(Test):
         calls each of the test in a loop for the given values
         """
         self.__online_cpus(totalcpus)
+        cores = self.__core_map()
+        del transitions[:]
+        if self.cpuhp_trace:
+            self.__set_cpuhp_trace(True)
         if 'all' in self.tests:
             tests = ['cpu_serial_off_on',
                      'single_cpu_toggle',
@@ -135,14 +259,14 @@ class cpustresstest(Test):
 
         for method in tests:
             self.log.info("\nTEST: %s\n", method)
-            self.__clear_dmesg()
             run_test = 'self.%s()' % method
             eval(run_test)
             msg = self.__error_check()
             if msg:
-                collect_dmesg()
+                self.whiteboard = msg
                 self.log.info('Test: %s. ERROR Message: %s', run_test, msg)
             self.log.info("\nEND: %s\n", method)
+        self.__hotplug_report(cores)
 
     def cpu_serial_off_on(self):
         """
@@ -156,19 +280,19 @@ class cpustresstest(Test):
             self.log.info("OFF-ON Serial Test %s", totalcpus)
             for cpus in range(1, totalcpus):
                 self.log.info("cpu%s going offline" % cpus)
-                cpu.offline(cpus)
+                cpu_offline(cpus)
             self.log.info("Online CPU's in reverse order %s", totalcpus)
             for cpus in range(totalcpus, -1, -1):
                 self.log.info("cpu%s going online" % cpus)
-                cpu.online(cpus)
+                cpu_online(cpus)
             self.log.info("Offline CPU's in reverse order %s", totalcpus)
             for cpus in range(totalcpus, -1, -2):
                 self.log.info("cpu%s going offline" % cpus)
-                cpu.offline(cpus)
+                cpu_offline(cpus)
             self.log.info("Online CPU's in serial")
             for cpus in range(0, totalcpus):
                 self.log.info("cpu%s going online" % cpus)
-                cpu.online(cpus)
+                cpu_online(cpus)
 
     def single_cpu_toggle(self):
         """
@@ -179,9 +303,9 @@ class cpustresstest(Test):
         for cpus in range(1, totalcpus):
             for _ in range(self.iteration):
                 self.log.info("cpu%s going offline" % cpus)
-                cpu.offline(cpus)
+                cpu_offline(cpus)
                 self.log.info("cpu%s going online" % cpus)
-                cpu.online(cpus)
+                cpu_online(cpus)
 
     def cpu_toggle_one_by_one(self):
         """
@@ -191,9 +315,9 @@ class cpustresstest(Test):
         for _ in range(self.iteration):
             for cpus in range(totalcpus):
                 self.log.info("cpu%s going offline" % cpus)
-                cpu.offline(cpus)
+                cpu_offline(cpus)
                 self.log.info("cpu%s going online" % cpus)
-                cpu.online(cpus)
+                cpu_online(cpus)
 
     def multiple_cpus_toggle(self):
         """
@@ -226,7 +350,7 @@ class cpustresstest(Test):
         self.log.info("\noffline cpus and see the affinity change")
         count = 0
         for pid in pids:
-            cpu.offline(count)
+            cpu_offline(count)
             process.run("taskset -pc %s" % pid, ignore_status=True, shell=True)
             count = count + 1
 
@@ -236,7 +360,7 @@ class cpustresstest(Test):
         for proc in range(totalcpus):
             process.run("taskset -pc $((%s<<1)) $$" %
                         proc, ignore_status=True, shell=True)
-            cpu.offline(proc)
+            cpu_offline(proc)
 
         self.__online_cpus(totalcpus)
 
@@ -294,6 +418,10 @@ class cpustresstest(Test):
         process.system_output(
             "ppc64_cpu --smt=off && ppc64_cpu --smt=on && ppc64_cpu --smt=%s" % self.curr_smt, shell=True)
         self.__online_cpus(totalcpus)
+        if getattr(self, 'cpuhp_trace', False):
+            self.__set_cpuhp_trace(False)
+        if hasattr(self, 'kmsg'):
+            self.kmsg.stop()
 
 
 if __name__ == "__main__":
@@ -21,6 +21,8 @@
 import os
 import json
 import re
+import math
+import multiprocessing
 
 from avocado import Test
 from avocado import main
@@ -75,7 +77,14 @@ class Ebizzy(Test):
         chunk_size = self.params.get('chunk_size', default=512000)
         seconds = self.params.get('seconds', default=100)
         num_threads = self.params.get('num_threads', default=100)
-        logfile = os.path.join(self.outputdir, 'ebizzy.log')
+        self.whiteboard = json.dumps(self.run_ebizzy(args, num_chunks,
+                                                     chunk_size, seconds,
+                                                     num_threads))
+
+    def run_ebizzy(self, args, num_chunks, chunk_size, seconds, num_threads):
+        """
+        Runs ebizzy once and returns records/s, real, user and sys time
+        """
         args2 = '-m -n %s -P -R -s %s -S %s -t %s' % (num_chunks, chunk_size,
                                                       seconds, num_threads)
         args = args + ' ' + args2
@@ -89,10 +98,77 @@ class Ebizzy(Test):
         usr_time = pattern.findall(results)[0]
         pattern = re.compile(r"sys (.*?) s")
         sys_time = pattern.findall(results)[0]
-        self.whiteboard = json.dumps({'records': records,
-                                      'real_time': real,
-                                      'user': usr_time,
-                                      'sys': sys_time})
+        return {'records': records,
+                'real_time': real,
+                'user': usr_time,
+                'sys': sys_time}
+
+    def test_scaling(self):
+        """
+        Sweep num_threads from 1 up to 2 x cpus and chunk_size, running
+        every point repetitions times after warmup discarded runs, and
+        report the records/s scalability curve with mean, stddev and
+        coefficient of variation
+        """
+        if not self.params.get('scaling_sweep', default=True):
+            self.cancel("scaling sweep is run in another variant")
+        args = self.params.get('args', default='')
+        num_chunks = self.params.get('num_chunks', default=1000)
+        seconds = self.params.get('sweep_seconds', default=10)
+        repetitions = int(self.params.get('repetitions', default=5))
+        warmup = int(self.params.get('warmup', default=1))
+        max_threads = 2 * multiprocessing.cpu_count()
+        threads = self.params.get('sweep_threads', default=None)
+        if threads:
+            threads = [int(thread) for thread in str(threads).split()]
+        else:
+            threads = []
+            thread = 1
+            while thread < max_threads:
+                threads.append(thread)
+                thread *= 2
+            threads.append(max_threads)
+        chunk_sizes = str(self.params.get('sweep_chunk_sizes',
+                                          default=self.params.get(
+                                              'chunk_size',
+                                              default=512000))).split()
+        curve = {}
+        for chunk_size in chunk_sizes:
+            curve[chunk_size] = []
+            base = None
+            for num_threads in threads:
+                for _ in range(warmup):
+                    self.run_ebizzy(args, num_chunks, chunk_size, seconds,
+                                    num_threads)
+                samples = [float(self.run_ebizzy(args, num_chunks,
+                                                 chunk_size, seconds,
+                                                 num_threads)['records'])
+                           for _ in range(repetitions)]
+                mean = sum(samples) / len(samples)
+                stddev = math.sqrt(sum([(sample - mean) ** 2
+                                        for sample in samples]) /
+                                   max(len(samples) - 1, 1))
+                if base is None:
+                    base = mean / num_threads
+                point = {'threads': num_threads,
+                         'mean': round(mean, 1),
+                         'stddev': round(stddev, 1),
+                         'cv': round(stddev / mean, 4) if mean else None,
+                         'efficiency': round(mean / (base * num_threads), 3)
+                         if base else None,
+                         'samples': samples}
+                curve[chunk_size].append(point)
+                self.log.info("chunk_size %s threads %s: %.1f records/s "
+                              "stddev %.1f cv %s efficiency %s", chunk_size,
+                              num_threads, mean, stddev, point['cv'],
+                              point['efficiency'])
+        with open(os.path.join(self.outputdir, 'ebizzy_scaling.json'),
+                  'w') as json_file:
+            json.dump(curve, json_file, indent=4)
+        self.whiteboard = json.dumps(dict(
+            [(chunk_size, [(point['threads'], point['mean'], point['cv'])
+                           for point in points])
+             for chunk_size, points in curve.items()]))
 
 
 if __name__ == "__main__":
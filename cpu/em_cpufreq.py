@@ -14,12 +14,18 @@
 # Copyright: 2017 IBM
 # Author: Shriya Kulkarni <shriyak@linux.vnet.ibm.com>
 import os
+import json
 import random
 import platform
 from avocado import Test
 from avocado import main
 from avocado.utils import process, distro, cpu
 from avocado.utils.software_manager import SoftwareManager
+try:
+    from time import monotonic as clock
+except ImportError:
+    # python 2 has no monotonic clock
+    from time import time as clock
 
 
 class Cpufreq(Test):
@@ -43,6 +49,9 @@ class Cpufreq(Test):
         for package in deps:
             if not smm.check_installed(package) and not smm.install(package):
                 self.cancel('%s is needed for the test to be run' % package)
+        self.timeout = float(self.params.get('transition_timeout',
+                                             default=1))
+        self.repeat = int(self.params.get('repeat', default=3))
 
     def test(self):
         """
@@ -77,6 +86,119 @@ class Cpufreq(Test):
             else:
                 self.log.info("Works as expected for iteration %s " % var)
 
+    def test_transition_matrix(self):
+        """
+        Measure the frequency transition latency for every pair of
+        available frequencies by writing scaling_setspeed and polling the
+        current frequency from sysfs, and the time the performance and
+        powersave governors take to reach their frequency from every
+        available frequency.
+        """
+        self.cpu = cpu.cpu_online_list()[0]
+        freqs = self.cpu_freq_path("scaling_available_frequencies").split()
+        governors = self.cpu_freq_path("scaling_available_governors").split()
+        if 'userspace' not in governors:
+            self.cancel("userspace governor is needed to set frequencies")
+        initial_governor = self.cpu_freq_path("scaling_governor")
+        cur_file = "cpuinfo_cur_freq"
+        if not os.access(self.freq_file(cur_file), os.R_OK):
+            cur_file = "scaling_cur_freq"
+        self.log.info("Polling %s of cpu %s", cur_file, self.cpu)
+        fd = os.open(self.freq_file(cur_file), os.O_RDONLY)
+        results = {'userspace': {}}
+        try:
+            self.write_freq_file("scaling_governor", "userspace")
+            for src in freqs:
+                results['userspace'][src] = {}
+                for dst in freqs:
+                    if src == dst:
+                        continue
+                    samples = []
+                    for _ in range(self.repeat):
+                        self.set_speed(fd, src)
+                        samples.append(self.set_speed(fd, dst))
+                    results['userspace'][src][dst] = self.median(samples)
+            targets = {'performance': freqs[0], 'powersave': freqs[-1]}
+            if int(freqs[-1]) > int(freqs[0]):
+                targets = {'performance': freqs[-1], 'powersave': freqs[0]}
+            for governor in governors:
+                if governor not in targets:
+                    self.log.info("%s governor has no fixed target "
+                                  "frequency, skipping", governor)
+                    continue
+                results[governor] = {}
+                for src in freqs:
+                    samples = []
+                    for _ in range(self.repeat):
+                        self.write_freq_file("scaling_governor", "userspace")
+                        self.set_speed(fd, src)
+                        start = clock()
+                        self.write_freq_file("scaling_governor", governor)
+                        samples.append(self.wait_freq(fd, targets[governor],
+                                                      start))
+                    results[governor][src] = self.median(samples)
+        finally:
+            os.close(fd)
+            self.write_freq_file("scaling_governor", initial_governor)
+        self.log.info("userspace transition latency in us, rows: from, "
+                      "columns: to (None: not reached in %s s)", self.timeout)
+        self.log.info("%10s %s", "", " ".join(["%10s" % dst
+                                               for dst in freqs]))
+        for src in freqs:
+            self.log.info("%10s %s", src, " ".join(
+                ["%10s" % results['userspace'][src].get(dst, '-')
+                 for dst in freqs]))
+        for governor in results:
+            if governor != 'userspace':
+                self.log.info("%s governor latency in us from every "
+                              "frequency: %s", governor, results[governor])
+        with open(os.path.join(self.outputdir, "cpufreq_latency.json"),
+                  'w') as json_file:
+            json.dump(results, json_file, indent=4)
+
+    @staticmethod
+    def median(samples):
+        """
+        Median of the reached samples, None if none was reached
+        """
+        samples = sorted([sample for sample in samples if sample is not None])
+        if not samples:
+            return None
+        return samples[len(samples) // 2]
+
+    def freq_file(self, name):
+        """
+        Path of the cpufreq sysfs file of the cpu under test
+        """
+        return "/sys/devices/system/cpu/cpu%s/cpufreq/%s" % (self.cpu, name)
+
+    def write_freq_file(self, name, value):
+        """
+        Write value to the cpufreq sysfs file of the cpu under test
+        """
+        with open(self.freq_file(name), 'w') as freq_file:
+            freq_file.write(str(value))
+
+    def set_speed(self, fd, freq):
+        """
+        Write freq to scaling_setspeed and return the time in us till
+        the current frequency read from fd reached it
+        """
+        start = clock()
+        self.write_freq_file("scaling_setspeed", freq)
+        return self.wait_freq(fd, freq, start)
+
+    def wait_freq(self, fd, freq, start):
+        """
+        Poll the current frequency from fd till it is freq, return the
+        time in us since start, or None on timeout
+        """
+        while clock() - start < self.timeout:
+            os.lseek(fd, 0, os.SEEK_SET)
+            if os.read(fd, 32).decode().strip() == str(freq):
+                return int((clock() - start) * 1000000)
+        return None
+
     def get_random_freq(self):
         """
         Get random frequency from list
@@ -16,9 +16,15 @@
 # Author: Shriya Kulkarni <shriyak@linux.vnet.ibm.com>
 import random
 import platform
+import threading
 from avocado import Test
 from avocado import main
 from avocado.utils import process, cpu
+try:
+    from time import monotonic as clock
+except ImportError:
+    # python 2 has no monotonic clock
+    from time import time as clock
 
 
 class cpuhotplug_test(Test):
@@ -52,6 +58,11 @@ class cpuhotplug_test(Test):
             self.max_smt = 2
         process.system_output("ppc64_cpu --smt=%s" % self.max_smt, shell=True)
         self.path = "/sys/devices/system/cpu"
+        self.concurrency = int(self.params.get("concurrency", default=4))
+        self.ops = int(self.params.get("ops", default=1000))
+        self.seed = int(self.params.get("seed",
+                                        default=random.randint(0, 10000)))
+        self.stall_ms = float(self.params.get("stall_ms", default=1000))
 
     def test(self):
         """
@@ -75,6 +86,82 @@ class cpuhotplug_test(Test):
         if self.nfail > 0:
             self.fail(" Unable to online/offline few cpus")
 
+    def test_concurrent(self):
+        """
+        Toggles cpus from concurrency workers at once, every worker
+        owning its own set of cpus (cpu0 stays online) and following a
+        random schedule derived from seed. Reports operations per second,
+        the latency of the operations and the ones which took longer than
+        stall_ms, which points at contention on the hotplug lock.
+        """
+        self.log.info("Concurrent hotplug with %s workers, %s operations, "
+                      "seed %s", self.concurrency, self.ops, self.seed)
+        cpus = range(1, self.T_CORES * self.max_smt)
+        latencies = []
+        failures = []
+        workers = []
+        for worker in range(self.concurrency):
+            owned = [cpu_num for cpu_num in cpus
+                     if cpu_num % self.concurrency == worker]
+            if not owned:
+                continue
+            rng = random.Random(self.seed + worker)
+            schedule = [rng.choice(owned)
+                        for _ in range(self.ops // self.concurrency)]
+            workers.append(threading.Thread(target=self.hotplug_worker,
+                                            args=(schedule, latencies,
+                                                  failures)))
+        start = clock()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = clock() - start
+        for cpu_num in cpus:
+            cpu.online(cpu_num)
+        if not latencies:
+            self.fail("no hotplug operation completed")
+        stalls = [(cpu_num, action, seconds)
+                  for cpu_num, action, seconds in latencies
+                  if seconds * 1000 > self.stall_ms]
+        self.log.info("%s operations in %.2f seconds: %.2f ops/s",
+                      len(latencies), elapsed, len(latencies) / elapsed)
+        samples = sorted([seconds for _, _, seconds in latencies])
+        self.log.info("latency (ms) min %.3f avg %.3f p99 %.3f max %.3f",
+                      samples[0] * 1000, sum(samples) * 1000 / len(samples),
+                      samples[max(int(len(samples) * 0.99) - 1, 0)] * 1000,
+                      samples[-1] * 1000)
+        self.log.info("%s operations stalled for more than %s ms",
+                      len(stalls), self.stall_ms)
+        for cpu_num, action, seconds in stalls:
+            self.log.info("stall: %s of cpu %s took %.3f ms", action,
+                          cpu_num, seconds * 1000)
+        self.whiteboard = "seed %s: %.2f ops/s, %s stalls, %s failures" \
+                          % (self.seed, len(latencies) / elapsed,
+                             len(stalls), len(failures))
+        if failures:
+            self.fail("Unable to online/offline cpus: %s" % failures)
+
+    @staticmethod
+    def hotplug_worker(schedule, latencies, failures):
+        """
+        Toggles every cpu of the schedule, recording the time every
+        operation took
+        """
+        for cpu_num in schedule:
+            if cpu._get_cpu_status(cpu_num):
+                action, toggle = 'offline', cpu.offline
+            else:
+                action, toggle = 'online', cpu.online
+            start = clock()
+            try:
+                status = toggle(cpu_num)
+            except (IOError, OSError):
+                status = 1
+            latencies.append((cpu_num, action, clock() - start))
+            if status:
+                failures.append((cpu_num, action))
+
     def random_gen_cores(self):
         """
         Generate random core list
@@ -14,6 +14,9 @@
 # Copyright: 2017 IBM
 # Author:Shriya Kulkarni <shriyak@linux.vnet.ibm.com>
 import os
+import glob
+import json
+import time
 import random
 import subprocess
 import re
@@ -22,6 +25,27 @@ from avocado import Test
 from avocado import main
 from avocado.utils import process, distro, cpu
 from avocado.utils.software_manager import SoftwareManager
+try:
+    from time import monotonic as clock
+except ImportError:
+    # python 2 has no monotonic clock
+    from time import time as clock
+
+
+def idle_snapshot():
+    """
+    Reads usage and time of every idle state of every cpu in one pass,
+    returns {(cpu, state): (usage, time in us)}
+    """
+    snapshot = {}
+    for path in glob.glob("/sys/devices/system/cpu/cpu[0-9]*/cpuidle/"
+                          "state[0-9]*"):
+        cpu_dir, state = path.split('/')[-3], path.split('/')[-1]
+        with open(os.path.join(path, "usage")) as usage_file:
+            usage = int(usage_file.read())
+        with open(os.path.join(path, "time")) as time_file:
+            snapshot[(cpu_dir, state)] = (usage, int(time_file.read()))
+    return snapshot
 
 
 class cpuidle(Test):
@@ -45,6 +69,15 @@ class cpuidle(Test):
         for package in deps:
             if not smm.check_installed(package) and not smm.install(package):
                 self.cancel('%s is needed for the test to be run' % package)
+        self.sample_interval = float(self.params.get('sample_interval',
+                                                     default=1))
+        self.sample_duration = float(self.params.get('sample_duration',
+                                                     default=10))
+        self.workload = self.params.get('workload', default=None)
+        self.wakeup_sleep = float(self.params.get('wakeup_sleep_ms',
+                                                  default=10)) / 1000
+        self.wakeup_samples = int(self.params.get('wakeup_samples',
+                                                  default=200))
 
     def test(self):
         """
@@ -74,6 +107,127 @@ class cpuidle(Test):
                               ": %s" % (cpu_idle_states, devicetree_list))
                 self.fail("FAIL: Please check the idle states")
 
+    def test_residency(self):
+        """
+        Sample usage and time of all idle states of all cpus every
+        sample_interval for sample_duration while the optional workload
+        runs, and report per state residency and entry rate. Then measure
+        timer wakeup latency with all states enabled and with the deepest
+        states disabled one more at a time.
+        """
+        states = sorted(set([state for _, state in idle_snapshot()]),
+                        key=lambda state: int(state[5:]))
+        if not states:
+            self.cancel("No cpuidle states available")
+        names = {}
+        for state in states:
+            with open("/sys/devices/system/cpu/cpu%s/cpuidle/%s/name"
+                      % (cpu.cpu_online_list()[0], state)) as name_file:
+                names[state] = name_file.read().strip()
+        workload = None
+        if self.workload:
+            workload = process.SubProcess(self.workload, shell=True)
+            workload.start()
+        series = []
+        try:
+            previous = idle_snapshot()
+            start = last = clock()
+            while last - start < self.sample_duration:
+                time.sleep(self.sample_interval)
+                now = clock()
+                current = idle_snapshot()
+                series.append(self.idle_stats(previous, current,
+                                              now - last))
+                previous, last = current, now
+        finally:
+            if workload:
+                workload.terminate()
+        report = {'states': names, 'series': series, 'wakeup_us': {}}
+        self.log.info("%-12s %12s %14s", "state", "residency %",
+                      "entries/cpu/s")
+        for state in states:
+            residency = sum([sample[state]['residency'] for sample in series
+                             if state in sample]) / len(series)
+            rate = sum([sample[state]['rate'] for sample in series
+                        if state in sample]) / len(series)
+            self.log.info("%-12s %12.2f %14.2f", names[state], residency,
+                          rate)
+        disabled = self.read_disabled()
+        try:
+            for count in range(len(states)):
+                for state in states[len(states) - count:]:
+                    self.set_disabled(state, '1')
+                label = "all enabled" if not count else \
+                    "%s disabled" % ",".join(
+                        [names[state] for state in states[-count:]])
+                latency = self.wakeup_latency()
+                report['wakeup_us'][label] = latency
+                self.log.info("timer wakeup latency with %s: %s us", label,
+                              latency)
+        finally:
+            for path, value in disabled.items():
+                with open(path, 'w') as disable_file:
+                    disable_file.write(value)
+        with open(os.path.join(self.outputdir, "cpuidle.json"),
+                  'w') as json_file:
+            json.dump(report, json_file, indent=4)
+
+    @staticmethod
+    def idle_stats(previous, current, elapsed):
+        """
+        Per state residency in percent of the time of all cpus and entry
+        rate per cpu per second between two snapshots
+        """
+        cpus = len(set([cpu_dir for cpu_dir, _ in current]))
+        stats = {}
+        for (cpu_dir, state), (usage, idle_time) in current.items():
+            if (cpu_dir, state) not in previous:
+                continue
+            old_usage, old_time = previous[(cpu_dir, state)]
+            stat = stats.setdefault(state, {'residency': 0.0, 'rate': 0.0})
+            stat['residency'] += (idle_time - old_time) * 100.0 / \
+                (elapsed * 1000000 * cpus)
+            stat['rate'] += (usage - old_usage) / (elapsed * cpus)
+        return stats
+
+    @staticmethod
+    def read_disabled():
+        """
+        Current disable value of every idle state of every cpu
+        """
+        disabled = {}
+        for path in glob.glob("/sys/devices/system/cpu/cpu[0-9]*/cpuidle/"
+                              "state[0-9]*/disable"):
+            with open(path) as disable_file:
+                disabled[path] = disable_file.read().strip()
+        return disabled
+
+    @staticmethod
+    def set_disabled(state, value):
+        """
+        Write value to disable of the idle state on every cpu
+        """
+        for path in glob.glob("/sys/devices/system/cpu/cpu[0-9]*/cpuidle/"
+                              "%s/disable" % state):
+            with open(path, 'w') as disable_file:
+                disable_file.write(value)
+
+    def wakeup_latency(self):
+        """
+        Sleep wakeup_sleep wakeup_samples times, return avg/p99/max of the
+        time overslept in us
+        """
+        samples = []
+        for _ in range(self.wakeup_samples):
+            start = clock()
+            time.sleep(self.wakeup_sleep)
+            samples.append((clock() - start - self.wakeup_sleep) * 1000000)
+        samples.sort()
+        return {'avg': round(sum(samples) / len(samples), 1),
+                'p99': round(samples[max(int(len(samples) * 0.99) - 1, 0)],
+                             1),
+                'max': round(samples[-1], 1)}
+
     def read_from_device_tree(self):
         """
         Read from device tree
@@ -17,6 +17,10 @@
 
 
 import os
+import re
+import glob
+import json
+import shutil
 
 from avocado import Test
 from avocado import main
@@ -69,11 +73,125 @@ class Numactl(Test):
 
         build.make(self.sourcedir)
 
+        self.bw_size = int(self.params.get('bw_size_mb', default=512))
+        self.bw_iterations = int(self.params.get('bw_iterations', default=5))
+        self.lat_size = int(self.params.get('lat_size_mb', default=256))
+        self.lat_loads = int(self.params.get('lat_loads', default=20000000))
+        self.tolerance = float(self.params.get('tolerance', default=0.1))
+        self.fail_on_mismatch = self.params.get('fail_on_mismatch',
+                                                default=False)
+
     def test(self):
 
         if build.make(self.sourcedir, extra_args='test', ignore_status=True):
             self.fail('test failed, Please check debug log')
 
+    def test_numa_matrix(self):
+        """
+        Run a bandwidth and a latency kernel bound to every (cpu node,
+        memory node) pair, and compare the matrices with the node
+        distance table reported by the kernel
+        """
+        cpu_nodes = self.nodes('has_cpu')
+        mem_nodes = self.nodes('has_memory')
+        if len(mem_nodes) < 2:
+            self.cancel("Need at least 2 memory nodes, got %s" % mem_nodes)
+        shutil.copyfile(os.path.join(self.datadir, 'numa_matrix.c'),
+                        os.path.join(self.srcdir, 'numa_matrix.c'))
+        binary = os.path.join(self.srcdir, 'numa_matrix')
+        process.run("gcc -O2 -o %s %s.c" % (binary, binary), shell=True)
+        numactl = os.path.join(self.sourcedir, 'numactl')
+        distance = {}
+        bandwidth = {}
+        latency = {}
+        for cpu_node in cpu_nodes:
+            with open("/sys/devices/system/node/node%s/distance"
+                      % cpu_node) as distance_file:
+                row = distance_file.read().split()
+            distance[cpu_node] = dict(zip(self.nodes(), map(int, row)))
+            bandwidth[cpu_node] = {}
+            latency[cpu_node] = {}
+            for mem_node in mem_nodes:
+                bind = "%s --cpunodebind=%s --membind=%s %s" \
+                       % (numactl, cpu_node, mem_node, binary)
+                output = process.system_output("%s bw %s %s" % (
+                    bind, self.bw_size, self.bw_iterations), shell=True)
+                bandwidth[cpu_node][mem_node] = float(re.search(
+                    r"bandwidth_mbps: ([\d.]+)", output).group(1))
+                output = process.system_output("%s lat %s %s" % (
+                    bind, self.lat_size, self.lat_loads), shell=True)
+                latency[cpu_node][mem_node] = float(re.search(
+                    r"latency_ns: ([\d.]+)", output).group(1))
+        for name, matrix in [('distance', distance),
+                             ('bandwidth MB/s', bandwidth),
+                             ('latency ns', latency)]:
+            self.log.info("%s (rows: cpu node, columns: memory node)", name)
+            self.log.info("%6s %s", "", " ".join(["%10s" % node
+                                                  for node in mem_nodes]))
+            for cpu_node in cpu_nodes:
+                self.log.info("%6s %s", cpu_node, " ".join(
+                    ["%10s" % matrix[cpu_node][mem_node]
+                     for mem_node in mem_nodes]))
+        mismatches = self.distance_mismatches(distance, bandwidth, latency,
+                                              mem_nodes)
+        for mismatch in mismatches:
+            self.log.warn(mismatch)
+        with open(os.path.join(self.outputdir, "numa_matrix.json"),
+                  'w') as json_file:
+            json.dump({'distance': distance, 'bandwidth_mbps': bandwidth,
+                       'latency_ns': latency, 'mismatches': mismatches},
+                      json_file, indent=4)
+        if mismatches and self.fail_on_mismatch:
+            self.fail("%s node pairs do not match the distance table"
+                      % len(mismatches))
+
+    @staticmethod
+    def nodes(attribute=None):
+        """
+        Numa nodes, optionally only the ones listed in
+        /sys/devices/system/node/<attribute>
+        """
+        if attribute is None:
+            return sorted([int(path.split('node')[-1]) for path in
+                           glob.glob("/sys/devices/system/node/node[0-9]*")])
+        nodes = []
+        with open("/sys/devices/system/node/%s" % attribute) as node_file:
+            for part in node_file.read().strip().split(','):
+                if '-' in part:
+                    first, last = part.split('-')
+                    nodes.extend(range(int(first), int(last) + 1))
+                elif part:
+                    nodes.append(int(part))
+        return nodes
+
+    def distance_mismatches(self, distance, bandwidth, latency, mem_nodes):
+        """
+        For every cpu node, a memory node which the distance table says
+        is closer than another one should not be slower (beyond the
+        tolerance) in latency or bandwidth
+        """
+        mismatches = []
+        for cpu_node in distance:
+            for near in mem_nodes:
+                for far in mem_nodes:
+                    if distance[cpu_node][near] >= distance[cpu_node][far]:
+                        continue
+                    if latency[cpu_node][near] > \
+                            latency[cpu_node][far] * (1 + self.tolerance):
+                        mismatches.append(
+                            "cpu node %s: memory node %s (distance %s) has "
+                            "higher latency than node %s (distance %s)"
+                            % (cpu_node, near, distance[cpu_node][near],
+                               far, distance[cpu_node][far]))
+                    if bandwidth[cpu_node][near] < \
+                            bandwidth[cpu_node][far] * (1 - self.tolerance):
+                        mismatches.append(
+                            "cpu node %s: memory node %s (distance %s) has "
+                            "lower bandwidth than node %s (distance %s)"
+                            % (cpu_node, near, distance[cpu_node][near],
+                               far, distance[cpu_node][far]))
+        return mismatches
+
 
 if __name__ == "__main__":
     main()
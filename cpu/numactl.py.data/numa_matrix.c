@@ -0,0 +1,127 @@
+/*
+   numa_matrix.c
+   Memory bandwidth and latency kernels, run under numactl binding to
+   measure one (cpu node, memory node) pair.
+
+   This program is free software; you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation; either version 2 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   Copyright: 2017 IBM
+
+   gcc -O2 -o numa_matrix numa_matrix.c
+
+   numa_matrix bw <size in MB> <iterations>
+       STREAM like triad a[i] = b[i] + s * c[i], prints bandwidth_mbps
+   numa_matrix lat <size in MB> <loads>
+       dependent loads over a random cyclic permutation, prints latency_ns
+*/
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+static double now(void)
+{
+	struct timespec ts;
+
+	clock_gettime(CLOCK_MONOTONIC, &ts);
+	return ts.tv_sec + ts.tv_nsec / 1e9;
+}
+
+static int bandwidth(size_t bytes, long iterations)
+{
+	size_t i, n = bytes / (3 * sizeof(double));
+	double *a, *b, *c, start, elapsed, best = 0;
+	long iter;
+
+	a = malloc(n * sizeof(double));
+	b = malloc(n * sizeof(double));
+	c = malloc(n * sizeof(double));
+	if (!a || !b || !c) {
+		perror("malloc");
+		return 1;
+	}
+	for (i = 0; i < n; i++) {
+		a[i] = 0;
+		b[i] = 1;
+		c[i] = 2;
+	}
+	for (iter = 0; iter < iterations; iter++) {
+		start = now();
+		for (i = 0; i < n; i++)
+			a[i] = b[i] + 3.0 * c[i];
+		elapsed = now() - start;
+		if (elapsed > 0 && 3 * n * sizeof(double) / elapsed > best)
+			best = 3 * n * sizeof(double) / elapsed;
+	}
+	/* keep the stores alive */
+	if (a[n / 2] != 7.0)
+		fprintf(stderr, "unexpected result %f\n", a[n / 2]);
+	printf("bandwidth_mbps: %.1f\n", best / (1024 * 1024));
+	return 0;
+}
+
+static int latency(size_t bytes, long loads)
+{
+	size_t i, j, n = bytes / sizeof(void *);
+	void **chain, **p;
+	size_t *order;
+	double start, elapsed;
+	long l;
+
+	chain = malloc(n * sizeof(void *));
+	order = malloc(n * sizeof(size_t));
+	if (!chain || !order) {
+		perror("malloc");
+		return 1;
+	}
+	for (i = 0; i < n; i++)
+		order[i] = i;
+	srand(1);
+	for (i = n - 1; i > 0; i--) {
+		j = ((size_t)rand() * RAND_MAX + rand()) % (i + 1);
+		size_t tmp = order[i];
+		order[i] = order[j];
+		order[j] = tmp;
+	}
+	for (i = 0; i < n; i++)
+		chain[order[i]] = &chain[order[(i + 1) % n]];
+	p = &chain[order[0]];
+	start = now();
+	for (l = 0; l < loads; l++)
+		p = (void **)*p;
+	elapsed = now() - start;
+	/* keep the chain walk alive */
+	if (!p)
+		return 1;
+	printf("latency_ns: %.2f\n", elapsed * 1e9 / loads);
+	return 0;
+}
+
+int main(int argc, char *argv[])
+{
+	size_t bytes;
+	long count;
+
+	if (argc != 4) {
+		fprintf(stderr, "usage: %s bw|lat <size in MB> <count>\n",
+			argv[0]);
+		return 1;
+	}
+	bytes = strtoul(argv[2], NULL, 10) * 1024 * 1024;
+	count = strtol(argv[3], NULL, 10);
+	if (!strcmp(argv[1], "bw"))
+		return bandwidth(bytes, count);
+	if (!strcmp(argv[1], "lat"))
+		return latency(bytes, count);
+	fprintf(stderr, "unknown mode %s\n", argv[1]);
+	return 1;
+}
@@ -17,12 +17,76 @@
 
 
 import os
+import glob
+import json
 
 from avocado import Test
 from avocado import main
 from avocado.utils import archive, build, process, distro, cpu
 from avocado.utils.software_manager import SoftwareManager
 
+# numatop columns following PID PROC and NODE in its dump mode output
+PROC_COLUMNS = ['rma', 'lma', 'rma_lma', 'cpi', 'cpu']
+NODE_COLUMNS = ['mem_all', 'mem_free', 'rma', 'lma', 'rma_lma', 'cpi',
+                'cpu']
+# unit suffixes of the node table memory columns, as a factor to GB
+MEM_UNITS = {'K': 1.0 / 1024 / 1024, 'M': 1.0 / 1024, 'G': 1.0, 'T': 1024.0}
+
+
+def mem_gb(field):
+    """
+    Converts a numatop memory column such as '63.9G' to GB
+    """
+    if field[-1:].upper() in MEM_UNITS:
+        return float(field[:-1]) * MEM_UNITS[field[-1].upper()]
+    return float(field)
+
+
+def parse_numatop(output):
+    """
+    Parses numatop dump mode (-d) output into a list of snapshots, one
+    per refresh, each with the per process and per node rows, node
+    memory in GB. numatop -d only dumps the window on screen, which is
+    the process window by default, so without switching to the node
+    overview the node rows are empty.
+    """
+    snapshots = []
+    table = None
+    for line in output.splitlines():
+        fields = line.split()
+        if not fields:
+            continue
+        if fields[:2] == ['PID', 'PROC']:
+            snapshots.append({'processes': [], 'nodes': []})
+            table = 'processes'
+            continue
+        if fields[0] == 'NODE' and len(fields) > 1 and \
+                not fields[1].isdigit():
+            if not snapshots:
+                snapshots.append({'processes': [], 'nodes': []})
+            table = 'nodes'
+            continue
+        if table is None:
+            continue
+        try:
+            if table == 'processes':
+                row = dict(zip(PROC_COLUMNS,
+                               map(float, fields[-len(PROC_COLUMNS):])))
+                row['pid'] = int(fields[0])
+                row['proc'] = " ".join(fields[1:-len(PROC_COLUMNS)])
+            else:
+                values = fields[-len(NODE_COLUMNS):]
+                row = dict(zip(NODE_COLUMNS,
+                               [mem_gb(value) for value in values[:2]] +
+                               [float(value) for value in values[2:]]))
+                row['node'] = int(fields[0])
+        except (ValueError, IndexError):
+            # end of the table, e.g. the key help line
+            table = None
+            continue
+        snapshots[-1][table].append(row)
+    return snapshots
+
 
 class Numatop(Test):
 
@@ -61,6 +125,9 @@ class Numatop(Test):
         os.chdir(self.sourcedir)
 
         build.make(self.sourcedir, extra_args='test')
+        self.gate_duration = int(self.params.get('gate_duration', default=30))
+        self.max_rma_ratio = float(self.params.get('max_rma_ratio',
+                                                   default=0.1))
 
     def test(self):
 
@@ -87,6 +154,63 @@ class Numatop(Test):
         if not mgen_flag:
             self.fail('Numatop failed to record mgen latency. Please check '
                       'the record file: %s/result_file' % self.sourcedir)
+        self.save_series(''.join(lines))
+
+    def save_series(self, output):
+        """
+        Saves the parsed numatop snapshots to numatop.json and returns
+        them
+        """
+        snapshots = parse_numatop(output)
+        with open(os.path.join(self.outputdir, 'numatop.json'),
+                  'w') as json_file:
+            json.dump(snapshots, json_file, indent=4)
+        return snapshots
+
+    def test_locality_gate(self):
+        """
+        Run mgen with its memory on the node of the cpu it runs on, which
+        should be all local accesses, record it with numatop, and fail if
+        mgen remote memory accesses exceed max_rma_ratio of all accesses
+        """
+        mgen = os.path.join(self.sourcedir, 'test/mgen/mgen')
+        cpu_num = cpu.cpu_online_list()[0]
+        node = glob.glob('/sys/devices/system/cpu/cpu%s/node*' % cpu_num)
+        node = node[0].split('node')[-1] if node else '0'
+        result_file = os.path.join(self.outputdir, 'numatop_dump')
+        self.numa_pid = process.SubProcess(
+            'numatop -d %s' % result_file, shell=True)
+        self.numa_pid.start()
+        process.run('%s -a %s -c %s -t %s' % (mgen, node, cpu_num,
+                                              self.gate_duration),
+                    shell=True, sudo=True)
+        self.numa_pid.terminate()
+        with open(result_file, 'r') as f_read:
+            snapshots = self.save_series(f_read.read())
+        rma = lma = 0
+        for index, snapshot in enumerate(snapshots):
+            for row in snapshot['processes']:
+                if row['proc'] == 'mgen':
+                    rma += row['rma']
+                    lma += row['lma']
+                    self.log.info("snapshot %s: mgen RMA %sK LMA %sK CPI %s "
+                                  "CPU%% %s", index, row['rma'], row['lma'],
+                                  row['cpi'], row['cpu'])
+            for row in snapshot['nodes']:
+                self.log.info("snapshot %s: node %s RMA %sK LMA %sK CPI %s "
+                              "CPU%% %s", index, row['node'], row['rma'],
+                              row['lma'], row['cpi'], row['cpu'])
+        if not rma + lma:
+            self.fail('Numatop recorded no memory access of mgen, check '
+                      '%s' % result_file)
+        ratio = rma / (rma + lma)
+        self.whiteboard = json.dumps({'rma_k': rma, 'lma_k': lma,
+                                      'rma_ratio': round(ratio, 4)})
+        self.log.info("mgen on cpu %s with memory on node %s: remote "
+                      "access ratio %.4f", cpu_num, node, ratio)
+        if ratio > self.max_rma_ratio:
+            self.fail('Remote memory access ratio %.4f of a node local '
+                      'workload is above %s' % (ratio, self.max_rma_ratio))
 
 
 if __name__ == "__main__":
@@ -19,12 +19,68 @@ Test to verify ppc64_cpu command.
 """
 
 import os
+import json
+import time
+import multiprocessing
 from avocado import Test
 from avocado import main
 from avocado.utils import process
 from avocado.utils import cpu
 from avocado.utils import distro
 from avocado.utils.software_manager import SoftwareManager
+try:
+    from time import monotonic as clock
+except ImportError:
+    # python 2 has no monotonic clock
+    from time import time as clock
+
+# largest buffer copied by the memory bound workload
+MEM_BUFFER_SIZE = 64 * 1024 * 1024
+
+
+def mem_available():
+    """
+    Returns MemAvailable from /proc/meminfo in bytes, MemFree on kernels
+    without it
+    """
+    meminfo = {}
+    with open('/proc/meminfo') as meminfo_file:
+        for line in meminfo_file:
+            key, value = line.split(':', 1)
+            meminfo[key] = int(value.split()[0]) * 1024
+    return meminfo.get('MemAvailable', meminfo['MemFree'])
+
+
+def cpu_workload(job):
+    """
+    CPU bound loop, returns the number of iterations done in the job
+    duration
+    """
+    duration = job[0]
+    count = 0
+    value = 1
+    end = time.time() + duration
+    while time.time() < end:
+        for _ in range(10000):
+            value = (value * 31 + 7) % 1000003
+        count += 10000
+    return count
+
+
+def mem_workload(job):
+    """
+    Memory bound loop copying between two buffers of the job buffer
+    size, returns the number of bytes copied in the job duration
+    """
+    duration, size = job
+    src = bytearray(size)
+    dst = bytearray(size)
+    copied = 0
+    end = time.time() + duration
+    while time.time() < end:
+        dst[:] = src
+        copied += size
+    return copied
 
 
 class PPC64Test(Test):
@@ -64,6 +120,8 @@ class PPC64Test(Test):
             self.max_smt_value = 8
         if cpu.get_cpu_arch().lower() == 'power6':
             self.max_smt_value = 2
+        self.perf_duration = int(self.params.get("perf_duration", default=10))
+        self.mem_buffer_mb = self.params.get("mem_buffer_mb", default=None)
 
     def equality_check(self, test_name, cmd1, cmd2):
         """
@@ -162,9 +220,86 @@ class PPC64Test(Test):
         """
         Tests smt on/off in a loop
         """
+        timings = {'off': [], 'on': []}
         for _ in range(1, 100):
-            process.run("ppc64_cpu --smt=off && ppc64_cpu --smt=on",
-                        shell=True)
+            for value in ['off', 'on']:
+                timings[value].append(self.smt_switch(value))
+        for value, samples in timings.items():
+            self.log.info("smt=%s switch: avg %.1f ms, max %.1f ms", value,
+                          sum(samples) / len(samples), max(samples))
+
+    @staticmethod
+    def smt_switch(value):
+        """
+        Sets the SMT value and returns the time it took in ms
+        """
+        start = clock()
+        process.run("ppc64_cpu --smt=%s" % value, shell=True)
+        return (clock() - start) * 1000
+
+    def mem_buffer_size(self):
+        """
+        Returns the buffer size of the memory bound workload, mem_buffer_mb
+        if given, else sized so the two buffers of every worker fit in a
+        quarter of the available memory, up to MEM_BUFFER_SIZE
+        """
+        if self.mem_buffer_mb:
+            return int(self.mem_buffer_mb) * 1024 * 1024
+        size = mem_available() // (4 * 2 * multiprocessing.cpu_count())
+        return max(min(size, MEM_BUFFER_SIZE), 1024 * 1024)
+
+    def workload(self, function, *args):
+        """
+        Runs the workload function on every online cpu at once with the
+        job (perf_duration, args..) and returns the sum of the work done
+        per second
+        """
+        job = (self.perf_duration,) + args
+        pool = multiprocessing.Pool(multiprocessing.cpu_count())
+        try:
+            work = pool.map(function, [job] * multiprocessing.cpu_count())
+        finally:
+            pool.close()
+            pool.join()
+        return sum(work) / float(self.perf_duration)
+
+    def test_smt_perf(self):
+        """
+        Switches SMT off -> 2 -> .. -> max and back to off, timing every
+        switch, and runs a CPU bound and a memory bound workload on all
+        online cpus at every SMT level, to report the switch cost against
+        the throughput gained over SMT off.
+        """
+        levels = ["off"] + [str(i) for i in range(2, self.max_smt_value + 1)]
+        self.smt_switch("off")
+        results = {}
+        for level in levels:
+            switch_ms = self.smt_switch(level) if level != "off" else 0
+            results[level] = {'switch_up_ms': round(switch_ms, 1),
+                              'cpus': multiprocessing.cpu_count(),
+                              'cpu_ops': self.workload(cpu_workload),
+                              'mem_mbps': self.workload(
+                                  mem_workload, self.mem_buffer_size()) /
+                              (1024 * 1024)}
+        for level in reversed(levels[:-1]):
+            results[level]['switch_down_ms'] = round(self.smt_switch(level),
+                                                     1)
+        base = results["off"]
+        self.log.info("%5s %5s %10s %12s %8s %10s %8s", "SMT", "cpus",
+                      "switch ms", "cpu ops/s", "gain", "mem MB/s", "gain")
+        for level in levels:
+            result = results[level]
+            result['cpu_gain'] = round(result['cpu_ops'] / base['cpu_ops'],
+                                       2)
+            result['mem_gain'] = round(result['mem_mbps'] /
+                                       base['mem_mbps'], 2)
+            self.log.info("%5s %5s %10s %12d %7.2fx %10d %7.2fx", level,
+                          result['cpus'], result['switch_up_ms'],
+                          result['cpu_ops'], result['cpu_gain'],
+                          result['mem_mbps'], result['mem_gain'])
+        with open(os.path.join(self.outputdir, "smt_perf.json"),
+                  'w') as json_file:
+            json.dump(results, json_file, indent=4)
 
     def tearDown(self):
         """
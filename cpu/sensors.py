@@ -18,6 +18,12 @@
 """
 Test for sensors command
 """
+import os
+import glob
+import json
+import threading
+import collections
+import multiprocessing
 from avocado import Test
 from avocado import main
 from avocado.utils import process, linux_modules
@@ -25,8 +31,31 @@ from avocado.utils import distro
 from avocado.utils.software_manager import SoftwareManager
 from avocado.utils import cpu
 
+try:
+    from time import monotonic as clock
+except ImportError:
+    # python 2 has no monotonic clock
+    from time import time as clock
+
 # TODO: Add possible errors of sensors command
 ERRORS = ['I/O error']
+# hwmon input files sampled, with their unit scale
+HWMON_INPUTS = {'temp': 1000.0, 'power': 1000000.0, 'fan': 1.0}
+
+
+def read_inputs(fds):
+    """
+    Reads all inputs through their open fds, None for an input that
+    can not be read
+    """
+    values = []
+    for fd in fds:
+        os.lseek(fd, 0, os.SEEK_SET)
+        try:
+            values.append(int(os.read(fd, 32)))
+        except (OSError, ValueError):
+            values.append(None)
+    return tuple(values)
 
 
 class Sensors(Test):
@@ -100,6 +129,126 @@ class Sensors(Test):
         if 'no sensors were detected' in det_op:
             self.cancel('No sensors found to test !')
 
+    @staticmethod
+    def hwmon_inputs():
+        """
+        Returns (name, path) of every temp, power and fan input of all
+        hwmon chips, name being chip/label
+        """
+        inputs = []
+        for chip in sorted(glob.glob("/sys/class/hwmon/hwmon*")):
+            try:
+                with open(os.path.join(chip, "name")) as name_file:
+                    chip_name = name_file.read().strip()
+            except IOError:
+                chip_name = os.path.basename(chip)
+            for kind in HWMON_INPUTS:
+                for path in sorted(glob.glob(os.path.join(
+                        chip, "%s*_input" % kind))):
+                    label = os.path.basename(path)[:-len("_input")]
+                    try:
+                        with open(path[:-len("input")] + "label") as lfile:
+                            label = lfile.read().strip()
+                    except IOError:
+                        pass
+                    inputs.append(("%s/%s/%s" % (chip_name, kind, label),
+                                   path))
+        return inputs
+
+    @staticmethod
+    def sample_loop(fds, interval, ring, stop, start):
+        """
+        Reads all inputs through their open fds every interval seconds
+        into the ring buffer as (seconds since start, values) till stop
+        is set
+        """
+        while not stop.wait(interval):
+            ring.append((round(clock() - start, 3), read_inputs(fds)))
+
+    def test_thermal_profile(self):
+        """
+        Sample hwmon temperature, power and fan inputs and the frequency
+        of cpu0 while a CPU stress load runs, and report per input the
+        peak and steady state values, and the time to throttle
+        """
+        interval = 1.0 / float(self.params.get('sample_rate', default=10))
+        load_time = int(self.params.get('load_time', default=120))
+        ring = collections.deque(maxlen=int(self.params.get(
+            'ring_size', default=int(load_time / interval) + 100)))
+        throttle_drop = float(self.params.get('throttle_drop', default=0.1))
+        smm = SoftwareManager()
+        if not smm.check_installed("stress") and not smm.install("stress"):
+            self.cancel("stress package is needed for the test to be run")
+        inputs = self.hwmon_inputs()
+        if not inputs:
+            self.cancel("No hwmon temp/power/fan inputs found")
+        freq_path = "/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq"
+        if os.path.exists(freq_path):
+            inputs.append(("cpu0/freq/kHz", freq_path))
+        fds = [os.open(path, os.O_RDONLY) for _, path in inputs]
+        # idle values before the load, the ring may wrap on long runs
+        idle = read_inputs(fds)
+        stop = threading.Event()
+        start = clock()
+        sampler = threading.Thread(target=self.sample_loop,
+                                   args=(fds, interval, ring, stop, start))
+        sampler.start()
+        try:
+            cmd = "stress --cpu %s --timeout %ss" % (
+                multiprocessing.cpu_count(), load_time)
+            process.run(cmd, ignore_status=True, shell=True)
+            load_end = round(clock() - start, 3)
+        finally:
+            stop.set()
+            sampler.join()
+            for fd in fds:
+                os.close(fd)
+        # samples taken after the load ended would skew the steady state
+        samples = [sample for sample in ring if sample[0] <= load_end]
+        if not samples:
+            self.fail("No hwmon samples collected")
+        # steady state is the mean of the last quarter of the run
+        steady = samples[-max(len(samples) // 4, 1):]
+        report = {'inputs': [name for name, _ in inputs], 'sensors': {}}
+        for index, (name, _) in enumerate(inputs):
+            values = [sample[1][index] for sample in samples
+                      if sample[1][index] is not None]
+            if not values:
+                continue
+            scale = HWMON_INPUTS.get(name.split('/')[1], 1.0)
+            steady_values = [sample[1][index] for sample in steady
+                             if sample[1][index] is not None] or values
+            idle_value = idle[index]
+            if idle_value is not None:
+                idle_value /= scale
+            report['sensors'][name] = {
+                'start': idle_value,
+                'peak': max(values) / scale,
+                'steady': round(sum(steady_values) / scale /
+                                len(steady_values), 2)}
+            self.log.info("%-40s start %10s peak %10s steady %10s", name,
+                          report['sensors'][name]['start'],
+                          report['sensors'][name]['peak'],
+                          report['sensors'][name]['steady'])
+        report['time_to_throttle'] = None
+        if inputs[-1][0] == "cpu0/freq/kHz":
+            # throttled once cpu0 runs throttle_drop below the highest
+            # frequency it reached under load so far
+            peak = 0
+            for stamp, values in samples:
+                if values[-1] is None:
+                    continue
+                peak = max(peak, values[-1])
+                if values[-1] < peak * (1 - throttle_drop):
+                    report['time_to_throttle'] = stamp
+                    break
+        self.log.info("time to throttle: %s seconds",
+                      report['time_to_throttle'])
+        report['samples'] = samples
+        with open(os.path.join(self.outputdir, "hwmon_samples.json"),
+                  'w') as json_file:
+            json.dump(report, json_file)
+
     def test(self):
         """
         Test for sensors command
@@ -16,12 +16,17 @@
 #
 
 import os
+import sys
 import re
 
 from avocado import Test
 from avocado import main
 from avocado.utils import archive, build, process
 from avocado.utils.software_manager import SoftwareManager
+# helpers shared between tests live in lib/ at the top of the tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, 'lib'))
+from kmsg_watcher import KmsgWatcher  # noqa
 
 
 class Trinity(Test):
@@ -78,12 +83,15 @@ class Trinity(Test):
         '''
 
         args = self.params.get('runarg', default=' ')
+        self.kmsg = KmsgWatcher(['unhandled', 'Call Trace:'],
+                                flags=re.I)
+        self.kmsg.start()
 
         process.system('su - trinity -c " %s  %s  %s"' %
                        (os.path.join(self.sourcedir, 'trinity'), args,
                         '-N 1000000'), shell=True)
 
-        dmesg = process.system_output('dmesg')
+        dmesg = "\n".join(self.kmsg.new_hits())
 
         # verify if system having issue after fuzzer run
 
@@ -95,6 +103,8 @@ class Trinity(Test):
             self.log.info("some call traces seen please check")
 
     def tearDown(self):
+        if hasattr(self, 'kmsg'):
+            self.kmsg.stop()
 
         process.system('userdel -r  trinity', sudo=True)
 
@@ -17,14 +17,30 @@
 #
 
 import os
+import sys
 import re
 import time
 import multiprocessing
 
 from avocado import Test
 from avocado import main
-from avocado.utils import process, cpu
+from avocado.utils import cpu
 from avocado.utils import linux_modules
+# helpers shared between tests live in lib/ at the top of the tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, 'lib'))
+from kmsg_watcher import KmsgWatcher  # noqa
+
+
+def reader_counts(message, name):
+    """
+    Returns the histogram following 'Reader Pipe:' or 'Reader Batch:' in
+    an rcutorture stats message as a list of ints
+    """
+    obj = re.search(r"%s:\s+([\d ]+)" % name, message)
+    if not obj:
+        return []
+    return [int(count) for count in obj.group(1).split()]
 
 
 class Rcutorture(Test):
@@ -95,17 +111,17 @@ class Rcutorture(Test):
         """
         seconds = 15
         os.chdir(self.logdir)
+        self.kmsg = KmsgWatcher(['Reader Pipe', 'Reader Batch'])
+        self.kmsg.start()
         if linux_modules.load_module('rcutorture'):
             self.cpus_toggle()
             time.sleep(seconds)
             self.cpus_toggle()
         linux_modules.unload_module('rcutorture')
 
-        dmesg = process.system_output('dmesg')
-
-        res = re.search(r'rcu-torture: Reader', dmesg, re.M | re.I)
-
-        self.results = str(res).splitlines()
+        # drop the timestamps, the checks below match message content
+        self.results = [hit.split('] ', 1)[1]
+                        for hit in self.kmsg.new_hits()]
 
         """
         Runs log ananlysis on the dmesg logs
@@ -115,19 +131,21 @@ class Rcutorture(Test):
         if len(pipe1) != 0:
             self.error('\nBUG: grace-period failure !')
 
+        # readers seeing an element more than one grace period old,
+        # anything past the first two histogram buckets, are failures
         pipe2 = [r for r in self.results if "Reader Pipe" in r]
         for p in pipe2:
-            nmiss = p.split(" ")[7]
-            if int(nmiss):
+            if sum(reader_counts(p, "Reader Pipe")[2:]):
                 self.error('\nBUG: rcutorture tests failed !')
 
         batch = [s for s in self.results if "Reader Batch" in s]
         for b in batch:
-            nmiss = b.split(" ")[7]
-            if int(nmiss):
+            if sum(reader_counts(b, "Reader Batch")[2:]):
                 self.log.info("\nWarning: near mis failure !!")
 
     def tearDown(self):
+        if hasattr(self, 'kmsg'):
+            self.kmsg.stop()
         if linux_modules.module_is_loaded('rcutorture'):
             linux_modules.unload_module('rcutorture')
 
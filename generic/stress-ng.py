@@ -17,19 +17,16 @@
 #
 
 import os
+import sys
 from avocado import Test
 from avocado import main
 import multiprocessing
 from avocado.utils import process, build, archive, distro
 from avocado.utils.software_manager import SoftwareManager
-
-
-def clear_dmesg():
-    process.run("dmesg -c ", sudo=True)
-
-
-def collect_dmesg(object):
-    object.whiteboard = process.system_output("dmesg")
+# helpers shared between tests live in lib/ at the top of the tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, 'lib'))
+from kmsg_watcher import KmsgWatcher  # noqa
 
 
 class stressng(Test):
@@ -84,7 +81,9 @@ class stressng(Test):
                 self.cancel(
                     "Unsupported OS, Please check the build logs !!")
         build.make(sourcedir, extra_args='install')
-        clear_dmesg()
+        self.kmsg = KmsgWatcher(['WARNING: CPU:', 'Oops', 'Segfault',
+                                 'soft lockup', 'Unable to handle'])
+        self.kmsg.start()
 
     def test(self):
         args = []
@@ -121,17 +120,14 @@ class stressng(Test):
             args.append('--times ')
         cmd = 'stress-ng %s' % " ".join(args)
         process.run(cmd, ignore_status=True, sudo=True)
-        collect_dmesg(self)
-        ERROR = []
-        pattern = ['WARNING: CPU:', 'Oops',
-                   'Segfault', 'soft lockup', 'Unable to handle']
-        logs = process.system_output('dmesg').splitlines()
-        for fail_pattern in pattern:
-            for log in logs:
-                if fail_pattern in log:
-                    ERROR.append(log)
+        ERROR = self.kmsg.new_hits()
+        self.whiteboard = "\n".join(ERROR)
         if ERROR:
-            self.fail("Test failed with following errors in demsg :  %s " % "\n".joing(ERROR))
+            self.fail("Test failed with following errors in demsg :  %s " % "\n".join(ERROR))
+
+    def tearDown(self):
+        if hasattr(self, 'kmsg'):
+            self.kmsg.stop()
 
 
 if __name__ == "__main__":
@@ -15,10 +15,15 @@
 # Author: Hariharan T.S.  <harihare@in.ibm.com>
 
 import os
+import sys
 from avocado import Test
 from avocado import main
 from avocado.utils import process, git
 from avocado.utils.software_manager import SoftwareManager
+# helpers shared between tests live in lib/ at the top of the tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, 'lib'))
+from kmsg_watcher import KmsgWatcher  # noqa
 
 
 class Sysbench(Test):
@@ -29,16 +34,10 @@ class Sysbench(Test):
     :avocado: tags=cpu,threads
     """
 
-    def clear_dmesg(self):
-        process.run("dmesg -c ", sudo=True)
-
     def verify_dmesg(self):
-        self.whiteboard = process.system_output("dmesg")
-        pattern = ['WARNING: CPU:', 'Oops',
-                   'Segfault', 'soft lockup', 'Unable to handle']
-        for fail_pattern in pattern:
-            if fail_pattern in self.whiteboard:
-                self.fail("Test Failed : %s in dmesg" % fail_pattern)
+        self.whiteboard = "\n".join(self.kmsg.new_hits())
+        if self.whiteboard:
+            self.fail("Test Failed : %s in dmesg" % self.whiteboard)
 
     def run_cmd(self, cmdline):
         try:
@@ -78,7 +77,9 @@ class Sysbench(Test):
         self.test_type = self.params.get('type', default='cpu')
         self.cpu_max_prime = int(self.params.get('cpu-max-prime', default=100))
         self.threads_locks = self.params.get('threads-locks', default=None)
-        self.clear_dmesg()
+        self.kmsg = KmsgWatcher(['WARNING: CPU:', 'Oops', 'Segfault',
+                                 'soft lockup', 'Unable to handle'])
+        self.kmsg.start()
 
     def test(self):
         args = []
@@ -96,6 +97,10 @@ class Sysbench(Test):
         self.run_cmd(cmdline)
         self.verify_dmesg()
 
+    def tearDown(self):
+        if hasattr(self, 'kmsg'):
+            self.kmsg.stop()
+
 
 if __name__ == "__main__":
     main()
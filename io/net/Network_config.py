@@ -18,11 +18,78 @@
 # network configuration includes speed,
 # driver name, businfo, hardware address
 
+import os
+import sys
+import json
+import time
 import netifaces
 from avocado import main
 from avocado import Test
 from avocado.utils.software_manager import SoftwareManager
 from avocado.utils import process
+# helpers shared between tests live in lib/ at the top of the tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, os.pardir, 'lib'))
+from ethtool_parse import parse_ethtool  # noqa
+
+
+# Echoed before every ethtool query output
+ETHTOOL_MARKER = "__AVOCADO_ETHTOOL__"
+# ethtool option for every snapshot section
+ETHTOOL_MODES = [('link', ''), ('info', '-i'), ('rings', '-g'),
+                 ('channels', '-l'), ('coalesce', '-c'), ('offloads', '-k')]
+
+
+def read_sysfs(path):
+    """
+    Returns the stripped content of a sysfs file, or None when it can
+    not be read (e.g. speed of an interface which is down)
+    """
+    try:
+        with open(path) as sysfs_file:
+            return sysfs_file.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def interfaces_snapshot(interfaces):
+    """
+    Snapshot of the configuration of the given interfaces: driver, bus
+    info, mtu, operstate, duplex, speed and address come from sysfs,
+    link settings, rings, channels, coalescing and offloads from ethtool,
+    queried for all interfaces in a single shell process
+    """
+    snapshot = {}
+    for iface in interfaces:
+        path = "/sys/class/net/%s" % iface
+        info = {}
+        for name in ['mtu', 'operstate', 'duplex', 'speed', 'address',
+                     'carrier']:
+            info[name] = read_sysfs(os.path.join(path, name))
+        info['driver'] = None
+        info['bus_info'] = None
+        if os.path.exists(os.path.join(path, "device")):
+            info['bus_info'] = os.path.basename(
+                os.readlink(os.path.join(path, "device")))
+            if os.path.exists(os.path.join(path, "device", "driver")):
+                info['driver'] = os.path.basename(
+                    os.readlink(os.path.join(path, "device", "driver")))
+        snapshot[iface] = info
+    if not interfaces:
+        return snapshot
+    modes = " ".join(["'%s'" % (mode or ' ') for _, mode in ETHTOOL_MODES])
+    cmd = "for i in %s; do for m in %s; do echo \"%s $i $m\"; " \
+          "ethtool $m $i 2>/dev/null; done; done" \
+          % (" ".join(interfaces), modes, ETHTOOL_MARKER)
+    output = process.system_output(cmd, shell=True, ignore_status=True)
+    names = dict([(mode, name) for name, mode in ETHTOOL_MODES])
+    for section in output.split(ETHTOOL_MARKER)[1:]:
+        header, _, body = section.partition('\n')
+        header = header.split()
+        iface = header[0]
+        mode = header[1] if len(header) > 1 else ''
+        snapshot[iface][names[mode]] = parse_ethtool(body)
+    return snapshot
 
 
 class NetworkconfigTest(Test):
@@ -48,13 +115,12 @@ class NetworkconfigTest(Test):
         '''
         check Network_configuration
         '''
-        cmd = "ethtool -i %s | grep driver | awk '{print $2}'" % self.iface
-        driver = process.system_output(cmd, shell=True).strip()
+        snapshot = interfaces_snapshot([self.iface])[self.iface]
+        driver = snapshot['driver']
         self.log.info(driver)
-        cmd = "ethtool -i %s | grep bus-info | awk '{print $2}'" % self.iface
-        businfo = process.system_output(cmd, shell=True).strip()
+        businfo = snapshot['info'].get('bus-info', snapshot['bus_info'])
         self.log.info(businfo)
-        cmd = "lspci -v"
+        cmd = "lspci -D -v -s %s" % businfo
         bus_info = process.system_output(cmd, shell=True).strip()
         bus_info = bus_info.split('\n\n')
         self.log.info("Performing driver match check using lspci and ethtool")
@@ -69,29 +135,17 @@ class NetworkconfigTest(Test):
                         self.log.info(driverinfo)
                         if driver != driverinfo:
                             self.fail("mismatch in driver information")
-        cmd = "cat /sys/module/%s/drivers/pci\:%s/%s/net/%s/mtu" %\
-              (driver, driver, businfo, self.iface)
-        mtu = process.system_output(cmd, shell=True).strip()
+        mtu = snapshot['mtu']
         self.log.info("mtu value is %s" % mtu)
-        cmd = "cat /sys/module/%s/drivers/pci\:%s/%s/net/%s/operstate" %\
-              (driver, driver, businfo, self.iface)
-        operstate = process.system_output(cmd, shell=True).strip()
+        operstate = snapshot['operstate']
         self.log.info("operstate is %s" % operstate)
-        cmd = "cat /sys/module/%s/drivers/pci\:%s/%s/net/%s/duplex" %\
-              (driver, driver, businfo, self.iface)
-        duplex = process.system_output(cmd, shell=True).strip()
+        duplex = snapshot['duplex']
         self.log.info("transmission mode is %s" % duplex)
-        cmd = "cat /sys/module/%s/drivers/pci\:%s/%s/net/%s/address" %\
-              (driver, driver, businfo, self.iface)
-        address = process.system_output(cmd, shell=True).strip()
+        address = snapshot['address']
         self.log.info("mac address is %s" % address)
-        cmd = "cat /sys/module/%s/drivers/pci\:%s/%s/net/%s/speed" %\
-              (driver, driver, businfo, self.iface)
-        speed = process.system_output(cmd, shell=True).strip()
+        speed = snapshot['speed']
         self.log.info("speed is %s" % speed)
-        cmd = "ethtool %s | grep Speed | awk '{print $2}'" % self.iface
-        eth_speed = process.system_output(cmd, shell=True).strip()
-        eth_speed = eth_speed.strip('Mb/s')
+        eth_speed = snapshot['link'].get('Speed', '').strip('Mb/s')
         self.log.info("Performing Ethtool and interface checks for interface")
         self.log.info("-----------------------------------------------------")
         if speed != eth_speed:
@@ -105,13 +159,37 @@ class NetworkconfigTest(Test):
         self.log.info("through ip link show, mtu value is %s" % mtuval)
         if mtu != mtuval:
             self.fail("mismatch in mtu")
-        eth_state = process.system_output("ethtool %s | grep 'Link detected:'\
-                                          " % self.iface, shell=True)
+        eth_state = snapshot['link'].get('Link detected', '')
         if 'yes' in eth_state and operstate == 'down':
             self.fail("mis match in link state")
         if 'no' in eth_state and operstate == 'up':
             self.fail("mis match in link state")
 
+    def test_config_audit(self):
+        '''
+        snapshot the configuration of every interface on the system,
+        including rings, channels, coalescing and offloads
+        '''
+        start = time.time()
+        snapshot = interfaces_snapshot(netifaces.interfaces())
+        self.log.info("snapshot of %s interfaces took %.3f seconds",
+                      len(snapshot), time.time() - start)
+        for iface in sorted(snapshot):
+            info = snapshot[iface]
+            rings = info.get('rings', {}).get('Current hardware settings',
+                                              {})
+            channels = info.get('channels', {}).get(
+                'Current hardware settings', {})
+            self.log.info("%s: driver %s, mtu %s, speed %s, %s, rx ring %s, "
+                          "tx ring %s, combined channels %s, rx-usecs %s",
+                          iface, info['driver'], info['mtu'], info['speed'],
+                          info['operstate'], rings.get('RX'),
+                          rings.get('TX'), channels.get('Combined'),
+                          info.get('coalesce', {}).get('rx-usecs'))
+        with open(os.path.join(self.outputdir, "interfaces.json"),
+                  'w') as json_file:
+            json.dump(snapshot, json_file, indent=4, sort_keys=True)
+
 
 if __name__ == "__main__":
     main()
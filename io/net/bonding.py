@@ -18,8 +18,11 @@
 # simultaneously increasing the bandwidth and providing redundancy.
 
 
+import re
 import time
 import os
+import sys
+import json
 import socket
 import fcntl
 import struct
@@ -30,6 +33,10 @@ from avocado.utils.software_manager import SoftwareManager
 from avocado.utils import distro
 from avocado.utils import process
 from avocado.utils import linux_modules
+# helpers shared between tests live in lib/ at the top of the tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, os.pardir, 'lib'))
+from ssh_mux import ssh_mux_options  # noqa
 
 
 class Bonding(Test):
@@ -71,9 +78,12 @@ class Bonding(Test):
         self.peer_first_ipinterface = self.params.get("peer_ip", default="")
         if not self.peer_interfaces or self.peer_first_ipinterface == "":
             self.cancel("peer machine should available")
+        self.ssh_opts = ssh_mux_options(
+            self.params.get("ssh_persist", default="600"))
+        self.peer = "%s@%s" % (self.user, self.peer_first_ipinterface)
         msg = "ip addr show  | grep %s | grep -oE '[^ ]+$'"\
               % self.peer_first_ipinterface
-        cmd = "ssh %s@%s %s" % (self.user, self.peer_first_ipinterface, msg)
+        cmd = "ssh %s %s %s" % (self.ssh_opts, self.peer, msg)
         self.peer_first_interface = process.system_output(cmd, shell=True
                                                           ).strip()
         if self.peer_first_interface == "":
@@ -92,14 +102,15 @@ class Bonding(Test):
             if local_ip == "":
                 self.fail("test failed because local ip can not retrieved")
             self.host_ips.append(local_ip)
-        for val in self.peer_interfaces:
-            msg = "ip -f inet -o addr show %s | awk '{print $4}' | cut -d /\
-                  -f1" % val
-            cmd = "ssh %s@%s \"%s\""\
-                  % (self.user, self.peer_first_ipinterface, msg)
-            peer_ip = process.system_output(cmd, shell=True).strip()
-            cmd = 'echo %s | cut -d " " -f4' % peer_ip
-            peer_ip = process.system_output(cmd, shell=True).strip()
+        # fetch the addresses of all peer interfaces in a single round trip,
+        # one output line per interface
+        msg = ";".join(["echo \\$(ip -f inet -o addr show %s | awk "
+                        "'{print \\$4}' | cut -d / -f1)" % val
+                        for val in self.peer_interfaces])
+        cmd = "ssh %s %s \"%s\"" % (self.ssh_opts, self.peer, msg)
+        peer_addrs = process.system_output(cmd, shell=True).splitlines()
+        for addrs in peer_addrs:
+            peer_ip = addrs.split()[0] if addrs.split() else ""
             if peer_ip == "":
                 self.fail("test failed because peer ip can not retrieved")
             self.peer_ips.append(peer_ip)
@@ -117,6 +128,13 @@ class Bonding(Test):
                                                 default=False)
         self.peer_wait_time = self.params.get("peer_wait_time", default=5)
         self.sleep_time = int(self.params.get("sleep_time", default=5))
+        self.failover_timing = self.params.get("failover_timing",
+                                               default=True)
+        self.probe_interval = float(self.params.get("probe_interval",
+                                                    default=0.001))
+        self.probe_hold = float(self.params.get("probe_hold", default=3))
+        self.iperf_port = self.params.get("iperf_port", default="")
+        self.iperf_duration = self.params.get("iperf_duration", default="30")
 
     def bond_remove(self, arg1):
         '''
@@ -170,6 +188,107 @@ class Bonding(Test):
             return False
         return True
 
+    def probe_failover(self, interface):
+        '''
+        Runs a timestamped high rate ping across the bond while the slave
+        interface is failed and restored, and returns the longest reply
+        gaps after each event, lost and reordered replies
+        '''
+        window = 2 * self.probe_hold + 2
+        cmd = "ping -D -n -I %s -i %s -w %d %s" \
+              % (self.bond_name, self.probe_interval, window,
+                 self.peer_first_ipinterface)
+        probe = process.SubProcess(cmd, verbose=False, shell=True)
+        probe.start()
+        time.sleep(1)
+        down_time = time.time()
+        process.system("ip link set %s down" % interface, shell=True,
+                       ignore_status=True)
+        time.sleep(self.probe_hold)
+        up_time = time.time()
+        process.system("ip link set %s up" % interface, shell=True,
+                       ignore_status=True)
+        probe.wait()
+        replies = [(float(stamp), int(seq)) for stamp, seq in
+                   re.findall(r"\[([\d.]+)\].*icmp_seq=(\d+)",
+                              probe.get_stdout())]
+        return self.probe_stats(replies, down_time, up_time)
+
+    def probe_stats(self, replies, down_time, up_time):
+        '''
+        Computes outage and recovery times in ms from (timestamp, seq)
+        probe replies around the slave down and up events, None when no
+        reply came after the event
+        '''
+        stats = {'lost': 0, 'reordered': 0, 'outage_ms': None,
+                 'recovery_ms': None}
+        if not replies:
+            return stats
+        seqs = [seq for _, seq in replies]
+        stats['lost'] = max(seqs) - min(seqs) + 1 - len(set(seqs))
+        highest = 0
+        for seq in seqs:
+            if seq < highest:
+                stats['reordered'] += 1
+            highest = max(highest, seq)
+        for key, start, end, floor in [
+                ('outage_ms', down_time, up_time, None),
+                ('recovery_ms', up_time, None, down_time)]:
+            # the longest gap between replies that spans the window, the
+            # gap open at the start runs to the first reply after it even
+            # when that reply only comes after the window
+            last = max([stamp for stamp, _ in replies if stamp <= start and
+                        (floor is None or stamp > floor)] or [start])
+            gap = None
+            for stamp, _ in sorted(replies):
+                if stamp <= start:
+                    continue
+                gap = max(gap or 0, stamp - last)
+                last = stamp
+                if end and stamp > end:
+                    break
+            if gap is not None:
+                gap = max(gap - self.probe_interval, 0)
+                stats[key] = round(gap * 1000, 3)
+        return stats
+
+    def bond_throughput(self):
+        '''
+        Aggregate throughput in Mb/s over the bond with all slaves up,
+        needs an iperf3 server listening on the peer
+        '''
+        cmd = "iperf3 -J -c %s -p %s -t %s -P %d" \
+              % (self.peer_first_ipinterface, self.iperf_port,
+                 self.iperf_duration, len(self.host_interfaces))
+        result = process.run(cmd, shell=True, ignore_status=True)
+        try:
+            tput = json.loads(result.stdout)
+            return round(tput['end']['sum_received']['bits_per_second'] /
+                         1000000.0, 2)
+        except (ValueError, KeyError):
+            self.log.info("iperf3 to %s failed, no throughput for mode %s",
+                          self.peer_first_ipinterface, self.mode)
+            return None
+
+    def bond_fail_timing(self, arg1):
+        '''
+        failover and recovery timing of every slave
+        '''
+        results = {'mode': arg1}
+        if self.iperf_port:
+            results['throughput_mbps'] = self.bond_throughput()
+        if len(self.host_interfaces) > 1:
+            for interface in self.host_interfaces:
+                stats = self.probe_failover(interface)
+                self.log.info("Mode %s, failing %s: outage %s ms, recovery "
+                              "%s ms, %s lost, %s reordered", arg1,
+                              interface, stats['outage_ms'],
+                              stats['recovery_ms'], stats['lost'],
+                              stats['reordered'])
+                results[interface] = stats
+                time.sleep(self.sleep_time)
+        self.whiteboard = json.dumps(results)
+
     def bond_fail(self, arg1):
         '''
         bond fail
@@ -297,6 +416,13 @@ class Bonding(Test):
             if process.system(peer_cmd, shell=True, ignore_status=True) != 0:
                 self.fail("bond setup command failed in peer machine")
 
+    def ssh_close(self):
+        '''
+        close the shared ssh connection to peer
+        '''
+        cmd = "ssh %s -O exit %s" % (self.ssh_opts, self.peer)
+        process.system(cmd, shell=True, ignore_status=True)
+
     def test_bonding(self):
         '''
         bonding the interfaces
@@ -304,9 +430,12 @@ class Bonding(Test):
         '''
         self.log.info("Bonding")
         msg = "[ -d /sys/class/net/%s ]" % self.bond_name
-        cmd = "ssh %s@%s %s" % (self.user, self.peer_first_ipinterface, msg)
+        cmd = "ssh %s %s %s" % (self.ssh_opts, self.peer, msg)
         if process.system(cmd, shell=True, ignore_status=True) == 0:
             self.fail("bond name already exists on peer machine")
+        # the peer address moves onto the bond below, so drop the shared
+        # connection rather than let later commands ride a stale one
+        self.ssh_close()
         self.bond_dir = os.path.join("/sys/class/net/", self.bond_name)
         if os.path.isdir(self.bond_dir):
             self.fail("bond name already exists on local machine")
@@ -317,6 +446,8 @@ class Bonding(Test):
         self.bond_setup("local", self.mode)
         process.run(self.bond_status, shell=True, verbose=True)
         self.ping_check(self.mode)
+        if self.failover_timing:
+            self.bond_fail_timing(self.mode)
         self.bond_fail(self.mode)
         self.log.info("Mode %s OK" % self.mode)
 
@@ -324,6 +455,7 @@ class Bonding(Test):
         '''
         set the initial state
         '''
+        self.ssh_close()
         self.bond_remove("local")
         for val1, val2, val3 in map(None, self.host_interfaces,
                                     self.host_ips, self.net_mask):
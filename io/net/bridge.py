@@ -16,6 +16,8 @@
 # Bridge interface test
 
 
+import json
+import time
 import netifaces
 from avocado import main
 from avocado import Test
@@ -65,6 +67,10 @@ class Bridging(Test):
             "awk '{ print $4 }'" % self.host_interface
         self.broadcast = process.system_output(
             '%s' % cmd, shell=True)
+        self.bridge_created = False
+        self.perf_ports = int(self.params.get("perf_ports", default=2))
+        self.perf_duration = self.params.get("perf_duration", default=10)
+        self.perf_bridge = "brperf"
 
     def test(self):
         '''
@@ -72,6 +78,7 @@ class Bridging(Test):
         Set up the ethernet bridge configuration in the linux kernel
         '''
         self.check_failure('brctl addbr br0')
+        self.bridge_created = True
         check_flag = False
         check_br = process.system_output(
             'brctl show', verbose=True, ignore_status=True)
@@ -92,10 +99,124 @@ class Bridging(Test):
         if process.system('ping %s -I br0 -c 4' % self.peer_ip, shell=True, ignore_status=True):
             self.fail('Ping using bridge failed')
 
+    def perf_setup(self):
+        '''
+        Creates the perf bridge with perf_ports veth ports, the far end of
+        each port living in its own namespace
+        '''
+        self.check_failure('brctl addbr %s' % self.perf_bridge)
+        for port in range(self.perf_ports):
+            self.check_failure('ip netns add brns%d' % port)
+            self.check_failure('ip link add brveth%d type veth peer name '
+                               'nsveth%d' % (port, port))
+            self.check_failure('ip link set nsveth%d netns brns%d' %
+                               (port, port))
+            self.check_failure('brctl addif %s brveth%d' %
+                               (self.perf_bridge, port))
+            self.check_failure('ip link set brveth%d up' % port)
+            self.check_failure('ip netns exec brns%d ip addr add '
+                               '10.199.0.%d/24 dev nsveth%d' %
+                               (port, port + 1, port))
+            self.check_failure('ip netns exec brns%d ip link set nsveth%d up'
+                               % (port, port))
+            self.check_failure('ip netns exec brns%d ip link set lo up' %
+                               port)
+        self.check_failure('ip link set %s up' % self.perf_bridge)
+
+    def perf_cleanup(self):
+        '''
+        Removes the perf bridge, veth ports and namespaces
+        '''
+        process.system('ip link set %s down' % self.perf_bridge,
+                       shell=True, ignore_status=True)
+        process.system('brctl delbr %s' % self.perf_bridge,
+                       shell=True, ignore_status=True)
+        for port in range(self.perf_ports):
+            process.system('ip link del brveth%d' % port, shell=True,
+                           ignore_status=True)
+            process.system('ip netns del brns%d' % port, shell=True,
+                           ignore_status=True)
+
+    def perf_run(self, udp_len):
+        '''
+        Drives iperf3 UDP streams between namespace pairs across the
+        bridge, returns the total forwarded pps and Mb/s
+        '''
+        servers = []
+        for port in range(1, self.perf_ports, 2):
+            cmd = 'ip netns exec brns%d iperf3 -s -1' % port
+            server = process.SubProcess(cmd, verbose=False, shell=True)
+            server.start()
+            servers.append(server)
+        # give the servers time to listen
+        time.sleep(1)
+        clients = []
+        for port in range(0, self.perf_ports - 1, 2):
+            cmd = 'ip netns exec brns%d iperf3 -J -u -b 0 -l %d -t %s -c ' \
+                  '10.199.0.%d' % (port, udp_len, self.perf_duration,
+                                   port + 2)
+            client = process.SubProcess(cmd, verbose=False, shell=True)
+            client.start()
+            clients.append(client)
+        pps = mbps = 0
+        for client in clients:
+            client.wait()
+            try:
+                result = json.loads(client.get_stdout())['end']['sum']
+            except (ValueError, KeyError):
+                self.fail('iperf3 across the bridge failed: %s' %
+                          client.get_stderr())
+            lost = result.get('lost_packets', 0)
+            pps += (result['packets'] - lost) / result['seconds']
+            mbps += result['bits_per_second'] / 1000000.0
+        for server in servers:
+            server.wait()
+        return int(pps), round(mbps, 2)
+
+    def test_bridge_perf(self):
+        '''
+        Forwarding performance of the bridge for 64 byte and mtu sized
+        frames, plain, with bridge netfilter and with vlan filtering
+        '''
+        smm = SoftwareManager()
+        if not smm.check_installed("iperf3") and not smm.install("iperf3"):
+            self.cancel("iperf3 package is need to test")
+        if self.perf_ports < 2 or self.perf_ports % 2:
+            self.cancel("perf_ports should be an even number >= 2")
+        self.perf_setup()
+        # udp payload of a 64 byte frame and of an mtu sized frame
+        frames = {'64': 18, 'mtu': 1472}
+        nf_file = '/proc/sys/net/bridge/bridge-nf-call-iptables'
+        vlan_file = '/sys/class/net/%s/bridge/vlan_filtering' % \
+            self.perf_bridge
+        process.system('modprobe br_netfilter', shell=True,
+                       ignore_status=True)
+        with open(nf_file) as proc_file:
+            nf_orig = proc_file.read().strip()
+        setups = [('plain', 0, 0), ('netfilter', 1, 0), ('vlan_filter', 0, 1)]
+        results = {}
+        try:
+            for name, netfilter, vlan in setups:
+                self.check_failure('echo %d > %s' % (netfilter, nf_file))
+                self.check_failure('echo %d > %s' % (vlan, vlan_file))
+                results[name] = {}
+                for frame, udp_len in sorted(frames.items()):
+                    pps, mbps = self.perf_run(udp_len)
+                    self.log.info('%s, %s frames: %s pps, %s Mb/s', name,
+                                  frame, pps, mbps)
+                    results[name][frame] = {'pps': pps, 'mbps': mbps}
+        finally:
+            process.system('echo %s > %s' % (nf_orig, nf_file), shell=True,
+                           ignore_status=True)
+        self.whiteboard = json.dumps(results)
+
     def tearDown(self):
         '''
         Set to original state
         '''
+        self.perf_cleanup()
+        if not self.bridge_created:
+            return
         self.check_failure('ip link set br0 down')
         self.check_failure('brctl delbr br0')
         self.check_failure('ip addr add %s broadcast %s dev %s' % (
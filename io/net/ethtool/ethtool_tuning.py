@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+#
+# Copyright: 2017 IBM
+#
+
+"""
+Sweeps ethtool ring sizes, interrupt coalescing and channel counts of an
+interface and measures throughput, pps and request/response latency
+against a peer at every point
+"""
+
+import os
+import sys
+import re
+import json
+import time
+import itertools
+import netifaces
+
+from avocado import main
+from avocado import Test
+from avocado.utils.software_manager import SoftwareManager
+from avocado.utils import process
+# helpers shared between tests live in lib/ at the top of the tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, os.pardir, os.pardir,
+                             'lib'))
+from ethtool_parse import parse_ethtool  # noqa
+from ssh_mux import ssh_mux_options  # noqa
+
+
+def pareto(points):
+    """
+    Returns the points not dominated by any other point, i.e. no other
+    point has both higher throughput and lower latency
+    """
+    front = []
+    for point in points:
+        dominated = False
+        for other in points:
+            if other is point:
+                continue
+            if other['mbps'] >= point['mbps'] and \
+                    other['rr_avg_ms'] <= point['rr_avg_ms'] and \
+                    (other['mbps'] > point['mbps'] or
+                     other['rr_avg_ms'] < point['rr_avg_ms']):
+                dominated = True
+                break
+        if not dominated:
+            front.append(point)
+    return front
+
+
+class EthtoolTuning(Test):
+    '''
+    ethtool ring, coalescing and channel tuning sweep
+    '''
+
+    def setUp(self):
+        '''
+        To check and install dependencies for the test
+        '''
+        smm = SoftwareManager()
+        for pkg in ["ethtool", "iperf3"]:
+            if not smm.check_installed(pkg) and not smm.install(pkg):
+                self.cancel("%s package is need to test" % pkg)
+        self.iface = self.params.get("interface")
+        if self.iface not in netifaces.interfaces():
+            self.cancel("%s interface is not available" % self.iface)
+        self.original = {}
+        self.peer = self.params.get("peer_ip")
+        if not self.peer:
+            self.cancel("peer_ip is needed to run the sweep")
+        self.ssh = "ssh %s %s" % (ssh_mux_options(
+            self.params.get("ssh_persist", default="600")), self.peer)
+        self.rings = self.params.get("rings", default="256 1024 4096").split()
+        self.rx_usecs = self.params.get("rx_usecs",
+                                        default="0 8 50 200").split()
+        self.adaptive = self.params.get("adaptive", default="on off").split()
+        self.channels = self.params.get("channels", default="1 4 8").split()
+        self.duration = int(self.params.get("duration", default=10))
+        self.iperf_port = self.params.get("iperf_port", default="5201")
+        for option in ['-g', '-c', '-l']:
+            output = process.system_output("ethtool %s %s" % (option,
+                                                              self.iface),
+                                           shell=True, ignore_status=True)
+            self.original[option] = parse_ethtool(output)
+        self.drop_unsupported()
+        if not (self.rings or self.adaptive or self.rx_usecs or
+                self.channels):
+            self.cancel("%s supports none of the swept ethtool settings"
+                        % self.iface)
+        cmd = "%s \"iperf3 -s -D -p %s\"" % (self.ssh, self.iperf_port)
+        if process.system(cmd, shell=True, ignore_status=True) != 0:
+            self.cancel("unable to start iperf3 server in peer")
+
+    def drop_unsupported(self):
+        '''
+        drops the sweep dimensions the driver does not support, judged
+        from the original ethtool -g/-c/-l output, and the ring and
+        channel counts above the pre-set maximums
+        '''
+        rings = self.original['-g'].get('Pre-set maximums', {})
+        channels = self.original['-l'].get('Pre-set maximums', {})
+        limits = [('rings', rings.get('RX')),
+                  ('channels', channels.get('Combined'))]
+        for name, limit in limits:
+            values = getattr(self, name)
+            if not values:
+                continue
+            if not limit or not limit.isdigit() or int(limit) == 0:
+                self.log.info("%s does not support setting %s, not swept",
+                              self.iface, name)
+                setattr(self, name, [])
+                continue
+            supported = [value for value in values
+                         if int(value) <= int(limit)]
+            if len(supported) != len(values):
+                self.log.info("%s above the maximum of %s on %s are not "
+                              "swept", name, limit, self.iface)
+            setattr(self, name, supported)
+        coalesce = self.original['-c']
+        for name, key in [('adaptive', 'Adaptive RX'),
+                          ('rx_usecs', 'rx-usecs')]:
+            value = coalesce.get(key, 'n/a')
+            if getattr(self, name) and value.startswith('n/a'):
+                self.log.info("%s does not support setting %s, not swept",
+                              self.iface, key)
+                setattr(self, name, [])
+
+    def nic_model(self):
+        '''
+        returns the NIC model of the interface from lspci
+        '''
+        info = parse_ethtool(process.system_output("ethtool -i %s"
+                                                   % self.iface, shell=True))
+        bus_info = info.get('bus-info', '')
+        model = process.system_output("lspci -D -s %s" % bus_info,
+                                      shell=True, ignore_status=True).strip()
+        if ': ' in model:
+            return model.split(': ', 1)[1]
+        return info.get('driver', self.iface)
+
+    def ethtool_set(self, option, settings):
+        '''
+        applies 'ethtool <option> <iface> key value ...', returns False
+        if the driver rejected it
+        '''
+        args = " ".join(["%s %s" % (key, value) for key, value in settings])
+        cmd = "ethtool %s %s %s" % (option, self.iface, args)
+        result = process.run(cmd, shell=True, ignore_status=True)
+        # ethtool fails with 'unmodified' when the value is already set
+        if result.exit_status != 0 and \
+                'unmodified' not in result.stderr + result.stdout:
+            self.log.info("'%s' failed: %s", cmd, result.stderr.strip())
+            return False
+        return True
+
+    def sweep_points(self):
+        '''
+        returns the (ring, adaptive, rx_usecs, channels) points to run,
+        rx_usecs is not swept while adaptive coalescing is on
+        '''
+        points = []
+        for ring, adaptive, usecs, channels in itertools.product(
+                self.rings or [None], self.adaptive or [None],
+                self.rx_usecs or [None], self.channels or [None]):
+            if adaptive == 'on':
+                usecs = None
+            point = (ring, adaptive, usecs, channels)
+            if point not in points:
+                points.append(point)
+        return points
+
+    def apply_point(self, ring, adaptive, usecs, channels):
+        '''
+        applies one sweep point, returns False if any setting failed
+        '''
+        if ring and not self.ethtool_set('-G', [('rx', ring),
+                                                ('tx', ring)]):
+            return False
+        coalesce = []
+        if adaptive:
+            coalesce.append(('adaptive-rx', adaptive))
+        if usecs:
+            coalesce.append(('rx-usecs', usecs))
+        if coalesce and not self.ethtool_set('-C', coalesce):
+            return False
+        if channels and not self.ethtool_set('-L', [('combined',
+                                                     channels)]):
+            return False
+        return self.wait_for_link()
+
+    def wait_for_link(self, timeout=30):
+        '''
+        ring and channel changes reset some NICs, waits for carrier
+        '''
+        end = time.time() + timeout
+        while time.time() < end:
+            try:
+                with open("/sys/class/net/%s/carrier" % self.iface) as fobj:
+                    if fobj.read().strip() == "1":
+                        return True
+            except IOError:
+                pass
+            time.sleep(0.1)
+        self.log.info("link of %s did not come back", self.iface)
+        return False
+
+    def read_packets(self):
+        '''
+        returns rx and tx packet counters of the interface
+        '''
+        packets = 0
+        for name in ['rx_packets', 'tx_packets']:
+            with open("/sys/class/net/%s/statistics/%s"
+                      % (self.iface, name)) as stat_file:
+                packets += int(stat_file.read())
+        return packets
+
+    def measure(self):
+        '''
+        bulk TCP throughput and pps with iperf3, request/response
+        latency with ping
+        '''
+        before = self.read_packets()
+        start = time.time()
+        cmd = "iperf3 -J -c %s -p %s -t %s" % (self.peer, self.iperf_port,
+                                               self.duration)
+        output = process.system_output(cmd, shell=True, ignore_status=True)
+        pps = int((self.read_packets() - before) / (time.time() - start))
+        try:
+            bps = json.loads(output)['end']['sum_received']['bits_per_second']
+        except (ValueError, KeyError):
+            return None
+        cmd = "ping -q -I %s -i 0.01 -c 200 %s" % (self.iface, self.peer)
+        output = process.system_output(cmd, shell=True, ignore_status=True)
+        obj = re.search(r"= [\d.]+/([\d.]+)/", output)
+        if not obj:
+            return None
+        return {'mbps': round(bps / 1000000.0, 2), 'pps': pps,
+                'rr_avg_ms': float(obj.group(1))}
+
+    def test(self):
+        '''
+        runs the sweep and reports the latency/throughput Pareto front
+        '''
+        model = self.nic_model()
+        results = []
+        for ring, adaptive, usecs, channels in self.sweep_points():
+            point = {'ring': ring, 'adaptive': adaptive, 'rx_usecs': usecs,
+                     'channels': channels}
+            if not self.apply_point(ring, adaptive, usecs, channels):
+                self.log.info("skipping unsupported point %s", point)
+                continue
+            perf = self.measure()
+            if not perf:
+                self.log.info("measurement failed for point %s", point)
+                continue
+            point.update(perf)
+            self.log.info("%s", point)
+            results.append(point)
+        if not results:
+            self.fail("no sweep point could be measured on %s" % self.iface)
+        front = pareto(results)
+        self.log.info("Latency vs throughput for %s (%s), * is Pareto "
+                      "optimal", self.iface, model)
+        self.log.info("%1s %6s %8s %8s %8s %10s %10s %10s", "", "ring",
+                      "adaptive", "rx-usecs", "channels", "Mb/s", "pps",
+                      "rr avg ms")
+        for point in sorted(results, key=lambda point: point['rr_avg_ms']):
+            self.log.info("%1s %6s %8s %8s %8s %10s %10s %10s",
+                          '*' if point in front else '', point['ring'],
+                          point['adaptive'], point['rx_usecs'],
+                          point['channels'], point['mbps'], point['pps'],
+                          point['rr_avg_ms'])
+        report = {'model': model, 'results': results, 'pareto': front}
+        with open(os.path.join(self.outputdir, "ethtool_tuning.json"),
+                  'w') as json_file:
+            json.dump(report, json_file, indent=4)
+        self.whiteboard = json.dumps({'model': model, 'pareto': front})
+
+    def restore(self):
+        '''
+        restores the original ring, coalescing and channel settings
+        '''
+        current = 'Current hardware settings'
+        rings = self.original.get('-g', {}).get(current, {})
+        settings = [(key.lower(), rings[key]) for key in ['RX', 'TX']
+                    if key in rings]
+        if settings:
+            self.ethtool_set('-G', settings)
+        coalesce = self.original.get('-c', {})
+        settings = []
+        obj = re.search(r"^(on|off)\b", coalesce.get('Adaptive RX', ''))
+        if obj:
+            settings.append(('adaptive-rx', obj.group(1)))
+        if 'rx-usecs' in coalesce:
+            settings.append(('rx-usecs', coalesce['rx-usecs']))
+        if settings:
+            self.ethtool_set('-C', settings)
+        channels = self.original.get('-l', {}).get(current, {})
+        if 'Combined' in channels:
+            self.ethtool_set('-L', [('combined', channels['Combined'])])
+        self.wait_for_link()
+
+    def tearDown(self):
+        '''
+        restores the interface and stops the iperf3 server in peer
+        '''
+        if not hasattr(self, 'ssh'):
+            return
+        if self.original:
+            self.restore()
+        cmd = "%s \"pkill -f 'iperf3 -s -D -p %s'\"" \
+              % (self.ssh, self.iperf_port)
+        process.system(cmd, shell=True, ignore_status=True)
+        process.system("%s -O exit" % self.ssh, shell=True,
+                       ignore_status=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,10 @@ from avocado.utils import process
 from avocado.utils.process import CmdError
 
 
+# Echoed after every remote command, followed by its exit status
+RC_MARKER = "__AVOCADO_RC__"
+
+
 class CommandFailed(Exception):
     def __init__(self, command, output, exitcode):
         self.command = command
@@ -126,20 +130,47 @@ class HtxNicTest(Test):
         '''
         SSH Run command method for running commands on remote server
         '''
-        self.log.info("Running the command on peer lpar %s", command)
+        output, exitcode = self.run_commands([command], timeout)[0]
+        if exitcode != 0:
+            raise CommandFailed(command, output, exitcode)
+        return output
+
+    def run_commands(self, commands, timeout=300):
+        '''
+        Runs a batch of commands on remote server in a single round trip.
+        Each command is followed by a marker carrying its exit status, so
+        output and status of every command come back in one response.
+        The batch stops at the first command that fails, returns a list
+        of (output, exitcode) in the order of commands, up to and
+        including the failed one
+        '''
+        for command in commands:
+            self.log.info("Running the command on peer lpar %s", command)
         if not hasattr(self, 'pxssh'):
             self.fail("SSH Console setup is not yet done")
         con = self.pxssh
-        con.sendline(command)
+        # commands after the first failing one are not run
+        con.sendline(" && ".join(["{ %s; rc=$?; echo %s$rc; test $rc = 0; }"
+                                  % (command, RC_MARKER)
+                                  for command in commands]))
         con.expect("\n")  # from us
         con.expect(con.PROMPT, timeout=timeout)
-        output = con.before.splitlines()
-        con.sendline("echo $?")
-        con.prompt(timeout)
-        exitcode = int(''.join(con.before.splitlines()[1:]))
-        if exitcode != 0:
-            raise CommandFailed(command, output, exitcode)
-        return output
+        results = []
+        output = []
+        for line in con.before.splitlines():
+            obj = re.search(r"%s(\d+)$" % RC_MARKER, line)
+            if obj:
+                if line[:obj.start()]:
+                    output.append(line[:obj.start()])
+                results.append((output, int(obj.group(1))))
+                output = []
+            else:
+                output.append(line)
+        if len(results) != len(commands) and \
+                (not results or results[-1][1] == 0):
+            command = commands[len(results)]
+            raise CommandFailed(command, output, -1)
+        return results
 
     def get_ips(self):
         self.host_ips = {}
@@ -150,11 +181,14 @@ class HtxNicTest(Test):
                                        shell=True, sudo=True)
             self.host_ips[intf] = ip
         self.peer_ips = {}
-        for intf in self.peer_intfs:
-            cmd = "ip addr list %s |grep 'inet ' |cut -d' ' -f6| \
-                  cut -d/ -f1" % intf
-            ip = self.run_command(cmd)[-1]
-            self.peer_ips[intf] = ip
+        cmds = ["ip addr list %s |grep 'inet ' |cut -d' ' -f6| \
+                cut -d/ -f1" % intf for intf in self.peer_intfs]
+        for intf, cmd, res in zip(self.peer_intfs, cmds,
+                                  self.run_commands(cmds)):
+            output, exitcode = res
+            if exitcode != 0:
+                raise CommandFailed(cmd, output, exitcode)
+            self.peer_ips[intf] = output[-1]
 
     def get_peer_distro(self):
         res = self.run_command("cat /etc/os-release")
@@ -277,20 +311,18 @@ class HtxNicTest(Test):
             for line in filedata:
                 file.write(line)
 
-        # Update other id's in peer lpar
+        # Update other id's in peer lpar, edited in place with sed so the
+        # check and the edit take a single round trip
         search_str2 = "other_ids=%s:" % self.peer_ip
         replace_str2 = "%s%s" % (search_str2, self.host_ip)
-        filedata = self.run_command("cat %s" % self.bpt_file)
-        for line in filedata:
-            obj = re.search(search_str2, line)
-            if obj:
-                idx = filedata.index(line)
-                filedata[idx] = replace_str2
-                break
-        else:
+        cmds = ["grep -q '%s' %s" % (search_str2, self.bpt_file),
+                "sed -i '0,/%s/s/.*%s.*/%s/' %s"
+                % (search_str2, search_str2, replace_str2, self.bpt_file)]
+        results = self.run_commands(cmds)
+        if results[0][1] != 0:
             self.fail("Failed to get other_ids string in peer lpar")
-        filedata = "\n".join(filedata)
-        self.run_command("echo \'%s\' > %s" % (filedata, self.bpt_file))
+        if results[-1][1] != 0:
+            raise CommandFailed(cmds[-1], results[-1][0], results[-1][1])
 
     def update_net_ids_in_bpt(self):
         """
@@ -307,26 +339,25 @@ class HtxNicTest(Test):
             for line in filedata:
                 file.write(line)
 
-        # Update net id in peer lpar
-        filedata = self.run_command("cat %s" % self.bpt_file)
-
+        # Update net id in peer lpar, all checks and edits in one round
+        # trip, the edits only run when every interface was found
+        cmds = []
+        edits = []
         for (peer_intf, net_id) in zip(self.peer_intfs, self.net_ids):
             search_str = "%s n" % peer_intf
             replace_str = "%s %s" % (peer_intf, net_id)
-
-            for line in filedata:
-                obj = re.search(search_str, line)
-                if obj:
-                    string = re.sub(search_str, replace_str, line)
-                    idx = filedata.index(line)
-                    filedata[idx] = string
-                    break
-            else:
-                self.fail("Failed to get intf %s net_id in peer bpt file",
-                          peer_intf)
-
-        filedata = "\n".join(filedata)
-        self.run_command("echo \'%s\' > %s" % (filedata, self.bpt_file))
+            cmds.append("grep -q '%s' %s" % (search_str, self.bpt_file))
+            edits.append("sed -i '0,/%s/s/%s/%s/g' %s"
+                         % (search_str, search_str, replace_str,
+                            self.bpt_file))
+        results = self.run_commands(cmds + edits)
+        output, exitcode = results[-1]
+        if exitcode != 0:
+            if len(results) <= len(cmds):
+                self.fail("Failed to get intf %s net_id in peer bpt file"
+                          % self.peer_intfs[len(results) - 1])
+            raise CommandFailed((cmds + edits)[len(results) - 1], output,
+                                exitcode)
 
     def htx_configure_net(self):
         self.log.info("Starting the N/W ping test for HTX in Host")
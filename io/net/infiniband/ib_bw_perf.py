@@ -23,12 +23,20 @@ ib_atomic_bw test
 '''
 
 
+import os
+import sys
+import re
 import time
+import json
 import netifaces
 from avocado import main
 from avocado import Test
 from avocado.utils.software_manager import SoftwareManager
 from avocado.utils import process, distro
+# helpers shared between tests live in lib/ at the top of the tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, os.pardir, os.pardir, 'lib'))
+from ssh_mux import ssh_mux_options  # noqa
 
 
 class BandwidthPerf(Test):
@@ -62,6 +70,8 @@ class BandwidthPerf(Test):
             self.cancel("%s interface is not available" % self.iface)
         if self.peer_ip == "":
             self.cancel("%s peer machine is not available" % self.peer_ip)
+        self.ssh = "ssh %s" % ssh_mux_options(
+            self.params.get("ssh_persist", default="600"))
         self.ca_name = self.params.get("CA_NAME", default="mlx4_0")
         self.port = self.params.get("PORT_NUM", default="1")
         self.peer_ca = self.params.get("PEERCA", default="mlx4_0")
@@ -73,6 +83,8 @@ class BandwidthPerf(Test):
         self.log.info("test with %s", self.tool_name)
         self.test_op = self.params.get("test_opt", default="").split(",")
         self.ext_test_op = self.params.get("ext_opt", default="").split(",")
+        self.sweep_op = self.params.get("sweep_opt",
+                                        default="-a,-a -b,-a -q 4").split(",")
 
         if detected_distro.name == "Ubuntu":
             cmd = "service ufw stop"
@@ -87,7 +99,8 @@ class BandwidthPerf(Test):
             cmd = "service iptables stop"
         else:
             self.cancel("Distro not supported")
-        if process.system("%s && ssh %s %s" % (cmd, self.peer_ip, cmd),
+        if process.system("%s && %s %s %s" % (cmd, self.ssh, self.peer_ip,
+                                              cmd),
                           ignore_status=True, shell=True) != 0:
             self.cancel("Unable to disable firewall")
 
@@ -97,9 +110,9 @@ class BandwidthPerf(Test):
         '''
         flag = 0
         logs = "> /tmp/ib_log 2>&1 &"
-        cmd = "ssh %s \" timeout %s %s -d %s -i %s %s %s %s\" " \
-            % (self.peer_ip, self.tmo, arg1, self.peer_ca, self.peer_port,
-               arg2, arg3, logs)
+        cmd = "%s %s \" timeout %s %s -d %s -i %s %s %s %s\" " \
+            % (self.ssh, self.peer_ip, self.tmo, arg1, self.peer_ca,
+               self.peer_port, arg2, arg3, logs)
         if process.system(cmd, shell=True, ignore_status=True) != 0:
             self.fail("ssh failed to remote machine\
                       or  faing data from remote machine failed")
@@ -108,11 +121,13 @@ class BandwidthPerf(Test):
         cmd = "timeout %s %s -d %s -i %s %s %s %s" \
             % (self.tmo, arg1, self.ca_name, self.port, self.peer_ip,
                arg2, arg3)
-        if process.system(cmd, shell=True, ignore_status=True) != 0:
+        result = process.run(cmd, shell=True, ignore_status=True)
+        self.client_output = result.stdout
+        if result.exit_status != 0:
             flag = 1
         self.log.info("server data for %s(%s)", arg1, arg2)
-        cmd = "ssh %s \"timeout %s cat /tmp/ib_log && rm -rf /tmp/ib_log\" " %\
-              (self.peer_ip, self.tmo)
+        cmd = "%s %s \"timeout %s cat /tmp/ib_log && rm -rf /tmp/ib_log\" " %\
+              (self.ssh, self.peer_ip, self.tmo)
         if process.system(cmd, shell=True, ignore_status=True) != 0:
             self.fail("ssh failed to remote machine\
                       or fetching data from remote machine failed")
@@ -137,6 +152,60 @@ class BandwidthPerf(Test):
         if err:
             self.fail("Some tests failed. Details below:\n%s" % "\n".join(err))
 
+    def test_ib_bandwidth_sweep(self):
+        '''
+        runs the tool over all message sizes for every sweep option and
+        stores the parsed client result table per message size
+        '''
+        results = {}
+        err = []
+        for val in self.sweep_op:
+            if self.bandwidthperf_exec(self.tool_name, val, "") != 0:
+                err.append("client cmd fail: %s %s" % (self.tool_name, val))
+                continue
+            results[val] = self.parse_results(self.client_output)
+            if not results[val]:
+                err.append("no results parsed: %s %s"
+                           % (self.tool_name, val))
+        with open(os.path.join(self.outputdir, '%s.json' % self.tool_name),
+                  'w') as result_file:
+            json.dump(results, result_file, indent=4)
+        self.whiteboard = json.dumps(results)
+        if err:
+            self.fail("Some tests failed. Details below:\n%s" % "\n".join(err))
+
+    @staticmethod
+    def parse_results(output):
+        '''
+        parses the perftest result table into a list of rows, one per
+        message size, keyed by column name
+        '''
+        columns = r"#bytes|#iterations|BW peak|BW average|MsgRate|t_min|" \
+                  r"t_max|t_typical|t_avg|t_stdev|99% percentile|" \
+                  r"99.9% percentile"
+        header = []
+        rows = []
+        for line in output.splitlines():
+            if "#bytes" in line:
+                header = re.findall(columns, line)
+                continue
+            values = line.split()
+            if not header or len(values) != len(header):
+                continue
+            try:
+                values = [float(val) for val in values]
+            except ValueError:
+                continue
+            rows.append(dict(zip(header, values)))
+        return rows
+
+    def tearDown(self):
+        '''
+        close the shared ssh connection to peer
+        '''
+        process.system("%s -O exit %s" % (self.ssh, self.peer_ip),
+                       shell=True, ignore_status=True)
+
 
 if __name__ == "__main__":
     main()
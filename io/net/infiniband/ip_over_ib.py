@@ -23,6 +23,7 @@ Unreliable Datagram (UD) mode or Connected mode (CM)
 
 import os
 import time
+import json
 import netifaces
 from avocado import main
 from avocado import Test
@@ -56,6 +57,8 @@ class IPOverIB(Test):
             if not smm.check_installed(pkg) and not smm.install(pkg):
                 self.cancel("%s package is need to test" % pkg)
         interfaces = netifaces.interfaces()
+        # (iface, mode, mtu, peer) to restore after the sweep
+        self.orig_mode_mtu = []
         self.iface = self.params.get("interface", default="")
         self.peer_ip = self.params.get("peer_ip", default="")
         if self.iface not in interfaces:
@@ -65,6 +68,11 @@ class IPOverIB(Test):
         self.tmo = self.params.get("TIMEOUT", default="600")
         self.iperf_run = self.params.get("IPERF_RUN", default="0")
         self.netserver_run = self.params.get("NETSERVER_RUN", default="0")
+        self.sweep_mtus = str(self.params.get(
+            "sweep_mtus", default="2044 4092 8192 16384 32768 65520")).split()
+        self.sweep_streams = str(self.params.get("sweep_streams",
+                                                 default="1 4 8")).split()
+        self.sweep_duration = self.params.get("sweep_duration", default="10")
         self.iper = os.path.join(self.teststmpdir, 'iperf')
         self.netperf = os.path.join(self.teststmpdir, 'netperf')
         if detected_distro.name == "Ubuntu":
@@ -182,6 +190,22 @@ class IPOverIB(Test):
         '''
         iperf test
         '''
+        self.iperf_server()
+        time.sleep(5)
+        cmd = "timeout %s %s -c %s -P 20 -n 8192" % \
+              (self.tmo, self.iperf + '/iperf3', self.peer_ip)
+        if process.system(cmd, shell=True, ignore_status=True) != 0:
+            self.fail("test failed because iperf not working")
+        self.log.info("server data for iperf")
+        msg = "timeout %s cat /tmp/ib_log" % self.tmo
+        cmd = "ssh %s \"%s\"" % (self.peer_ip, msg)
+        if process.system(cmd, shell=True, ignore_status=True) != 0:
+            self.fail("test failed because connect to peer sys failed")
+
+    def iperf_server(self):
+        '''
+        starts iperf3 server in peer, if not yet running
+        '''
         if self.iperf_run == 0:
             logs = "> /tmp/ib_log 2>&1 &"
             tmp = "chmod 777 /root/iperf-master/src/iperf3"
@@ -194,16 +218,95 @@ class IPOverIB(Test):
                 self.fail("test failed because connect to peer sys failed")
             else:
                 self.iperf_run = 1
-        time.sleep(5)
-        cmd = "timeout %s %s -c %s -P 20 -n 8192" % \
-              (self.tmo, self.iperf + '/iperf3', self.peer_ip)
-        if process.system(cmd, shell=True, ignore_status=True) != 0:
-            self.fail("test failed because iperf not working")
-        self.log.info("server data for iperf")
-        msg = "timeout %s cat /tmp/ib_log" % self.tmo
-        cmd = "ssh %s \"%s\"" % (self.peer_ip, msg)
-        if process.system(cmd, shell=True, ignore_status=True) != 0:
-            self.fail("test failed because connect to peer sys failed")
+
+    def set_mode_mtu(self, iface, mode, mtu, peer=False):
+        '''
+        switches the IPoIB interface to the mode and mtu, locally or
+        in peer, returns False when the interface rejects them
+        '''
+        tmp = "ip link set %s down; echo %s > /sys/class/net/%s/mode; " \
+              "ip link set %s mtu %s; ip link set %s up" \
+              % (iface, mode, iface, iface, mtu, iface)
+        if peer:
+            tmp = "ssh %s \"%s\"" % (self.peer_ip, tmp)
+        if process.system(tmp, shell=True, ignore_status=True) != 0:
+            return False
+        cmd = "cat /sys/class/net/%s/mtu" % iface
+        if peer:
+            cmd = "ssh %s \"%s\"" % (self.peer_ip, cmd)
+        return process.system_output(cmd, shell=True,
+                                     ignore_status=True).strip() == str(mtu)
+
+    def wait_for_peer(self):
+        '''
+        waits for the peer to answer again after an interface change
+        '''
+        cmd = "ping -c 1 -W 1 %s" % self.peer_ip
+        for _ in range(int(self.tmo)):
+            if process.system(cmd, shell=True, ignore_status=True) == 0:
+                return True
+        return False
+
+    def test_ipoib_sweep(self):
+        '''
+        throughput and cpu utilisation for every mode x mtu x stream
+        count, and the best configuration for the adapter
+        '''
+        if "ib" not in self.iface:
+            self.cancel("Not applicable for the interface %s" % self.iface)
+        tmp = "ip addr show | grep %s | grep -oE '[^ ]+$'" % self.peer_ip
+        cmd = "ssh %s \"%s\"" % (self.peer_ip, tmp)
+        peer_iface = process.system_output(cmd, shell=True).strip()
+        for iface, peer in [(peer_iface, True), (self.iface, False)]:
+            orig = []
+            for key in ['mode', 'mtu']:
+                cmd = "cat /sys/class/net/%s/%s" % (iface, key)
+                if peer:
+                    cmd = "ssh %s \"%s\"" % (self.peer_ip, cmd)
+                orig.append(process.system_output(cmd, shell=True).strip())
+            self.orig_mode_mtu.append((iface, orig[0], orig[1], peer))
+        self.iperf_server()
+        results = []
+        for mode in ['datagram', 'connected']:
+            for mtu in self.sweep_mtus:
+                if not (self.set_mode_mtu(peer_iface, mode, mtu, peer=True) and
+                        self.set_mode_mtu(self.iface, mode, mtu)):
+                    self.log.info("%s mode does not take mtu %s", mode, mtu)
+                    continue
+                if not self.wait_for_peer():
+                    self.fail("peer not reachable in %s mode mtu %s"
+                              % (mode, mtu))
+                for streams in self.sweep_streams:
+                    cmd = "timeout %s %s -J -c %s -P %s -t %s" % \
+                          (self.tmo, self.iperf + '/iperf3', self.peer_ip,
+                           streams, self.sweep_duration)
+                    output = process.system_output(cmd, shell=True,
+                                                   ignore_status=True)
+                    try:
+                        end = json.loads(output)['end']
+                        tput = end['sum_received']['bits_per_second']
+                        cpu = end['cpu_utilization_percent']
+                    except (ValueError, KeyError):
+                        self.fail("iperf failed in %s mode mtu %s with %s "
+                                  "streams" % (mode, mtu, streams))
+                    result = {'mode': mode, 'mtu': int(mtu),
+                              'streams': int(streams),
+                              'mbps': round(tput / 1000000.0, 2),
+                              'host_cpu': round(cpu['host_total'], 2),
+                              'peer_cpu': round(cpu['remote_total'], 2)}
+                    self.log.info("%s mtu %s streams %s: %s Mb/s, cpu host "
+                                  "%s%% peer %s%%", mode, mtu, streams,
+                                  result['mbps'], result['host_cpu'],
+                                  result['peer_cpu'])
+                    results.append(result)
+        if not results:
+            self.fail("no mode and mtu combination could be measured")
+        best = max(results, key=lambda result: result['mbps'])
+        self.log.info("Recommended for %s: %s mode, mtu %s, %s streams "
+                      "(%s Mb/s)", self.iface, best['mode'], best['mtu'],
+                      best['streams'], best['mbps'])
+        self.whiteboard = json.dumps({'results': results,
+                                      'recommended': best})
 
     def test_ip_over_ib(self):
         '''
@@ -221,8 +324,11 @@ class IPOverIB(Test):
 
     def tearDown(self):
         '''
-        removing the data in peer machine
+        restoring the IPoIB mode and mtu, removing the data in peer
+        machine
         '''
+        for iface, mode, mtu, peer in self.orig_mode_mtu:
+            self.set_mode_mtu(iface, mode, mtu, peer=peer)
         msg = "pkill iperf3; pkill netserver;rm -rf /tmp/ib_log;\
                rm -rf /root/iperf-master; rm -rf /root/netperf-2.7.0"
         cmd = "ssh %s \"%s\"" % (self.peer_ip, msg)
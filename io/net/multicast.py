@@ -18,6 +18,15 @@
 # to test we need to enable  multicast option on host
 # then ping from peer to multicast group
 
+import json
+import time
+import socket
+import struct
+import multiprocessing
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
 import netifaces
 from avocado import main
 from avocado import Test
@@ -25,6 +34,84 @@ from avocado.utils.software_manager import SoftwareManager
 from avocado.utils import process
 from avocado.utils import distro
 
+# sequence number marking the end of a fan-out stream
+END_SEQ = 0xffffffff
+
+
+def mcast_receiver(index, group, port, local_ip, ready, results):
+    '''
+    Joins the group on local_ip and counts the stream until its end marker,
+    reporting received packets, sequence span and one way latency under
+    the receiver index
+    '''
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM,
+                         socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4194304)
+    sock.bind(('', port))
+    mreq = socket.inet_aton(group) + socket.inet_aton(local_ip)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    sock.settimeout(5)
+    ready.set()
+    received = 0
+    max_seq = 0
+    latencies = []
+    start = end = None
+    while True:
+        try:
+            data = sock.recv(65535)
+        except socket.timeout:
+            break
+        now = time.time()
+        seq, sent = struct.unpack('!Id', data[:12])
+        if seq == END_SEQ:
+            break
+        if start is None:
+            start = now
+        end = now
+        received += 1
+        max_seq = max(max_seq, seq)
+        latencies.append(now - sent)
+    sock.close()
+    latencies.sort()
+    result = {'receiver': index, 'received': received, 'max_seq': max_seq,
+              'duration': (end - start) if received > 1 else 0,
+              'lat_avg_us': 0, 'lat_p99_us': 0, 'lat_max_us': 0}
+    if latencies:
+        result['lat_avg_us'] = round(sum(latencies) / len(latencies) * 1e6,
+                                     2)
+        result['lat_p99_us'] = round(
+            latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1e6, 2)
+        result['lat_max_us'] = round(latencies[-1] * 1e6, 2)
+    results.put(result)
+
+
+def mcast_sender(group, port, local_ip, rate, duration, size):
+    '''
+    Sends a sequence numbered, timestamped stream to the group at the given
+    packets/s rate, returns the number of packets sent
+    '''
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM,
+                         socket.IPPROTO_UDP)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF,
+                    socket.inet_aton(local_ip))
+    padding = b'\0' * max(size - 12, 0)
+    total = int(rate * duration)
+    start = time.time()
+    for seq in range(1, total + 1):
+        # pace against the schedule rather than sleeping per packet
+        delay = start + float(seq) / rate - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        sock.sendto(struct.pack('!Id', seq, time.time()) + padding,
+                    (group, port))
+    for _ in range(10):
+        sock.sendto(struct.pack('!Id', END_SEQ, time.time()), (group, port))
+    sock.close()
+    return total
+
 
 class ReceiveMulticastTest(Test):
     '''
@@ -66,6 +153,13 @@ class ReceiveMulticastTest(Test):
         self.local_ip = process.system_output(cmd, shell=True).strip()
         if self.local_ip == "":
             self.cancel("unable to get local ip")
+        self.group = self.params.get("group", default="239.1.1.1")
+        self.port = int(self.params.get("port", default=5001))
+        self.receivers = str(self.params.get("receivers",
+                                             default="1 2 4 8 16")).split()
+        self.rate = int(self.params.get("rate", default=10000))
+        self.duration = int(self.params.get("duration", default=10))
+        self.size = int(self.params.get("size", default=64))
 
     def test_multicast(self):
         '''
@@ -85,6 +179,56 @@ class ReceiveMulticastTest(Test):
         if process.system(cmd, shell=True, ignore_status=True) != 0:
             self.fail("multicast test failed")
 
+    def test_multicast_fanout(self):
+        '''
+        one sender, growing number of receiver processes joined to the
+        group; delivered packets/s, loss and latency per receiver
+        '''
+        results = {}
+        for count in self.receivers:
+            queue = multiprocessing.Queue()
+            procs = []
+            for index in range(int(count)):
+                ready = multiprocessing.Event()
+                proc = multiprocessing.Process(
+                    target=mcast_receiver, args=(index, self.group, self.port,
+                                                 self.local_ip, ready, queue))
+                proc.start()
+                ready.wait(10)
+                procs.append(proc)
+            sent = mcast_sender(self.group, self.port, self.local_ip,
+                                self.rate, self.duration, self.size)
+            receivers = []
+            try:
+                for _ in procs:
+                    receivers.append(queue.get(timeout=60))
+            except Empty:
+                for proc in procs:
+                    proc.terminate()
+                    proc.join()
+                reported = [rcv['receiver'] for rcv in receivers]
+                self.fail("%s receivers: receiver(s) %s did not report "
+                          "within 60s" % (count, ", ".join(
+                              [str(index) for index in range(len(procs))
+                               if index not in reported])))
+            for proc in procs:
+                proc.join()
+            for rcv in receivers:
+                rcv['loss'] = round(100.0 * (sent - rcv['received']) / sent,
+                                    3)
+                rcv['pps'] = 0
+                if rcv['duration']:
+                    rcv['pps'] = int(rcv['received'] / rcv['duration'])
+            total = sum([rcv['pps'] for rcv in receivers])
+            worst = max([rcv['loss'] for rcv in receivers])
+            self.log.info("%s receivers: %s delivered pps in total, worst "
+                          "loss %s%%, worst p99 latency %s us", count, total,
+                          worst, max([rcv['lat_p99_us']
+                                      for rcv in receivers]))
+            results[count] = {'sent': sent, 'delivered_pps': total,
+                              'receivers': receivers}
+        self.whiteboard = json.dumps(results)
+
     def tearDown(self):
         '''
         turn off multicast option
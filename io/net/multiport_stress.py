@@ -14,7 +14,10 @@
 # Copyright: 2017 IBM
 # Author: Harsha Thyagaraja <harshkid@linux.vnet.ibm.com>
 
+import re
+import json
 import netifaces
+from netifaces import AF_INET
 from avocado import main
 from avocado import Test
 from avocado.utils.software_manager import SoftwareManager
@@ -22,6 +25,23 @@ from avocado.utils import process
 from avocado.utils import distro
 
 
+def latency_histogram(samples):
+    '''
+    Buckets rtt samples (ms) by their upper bound
+    '''
+    bounds = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 50, 100]
+    histogram = {}
+    for sample in samples:
+        for bound in bounds:
+            if sample <= bound:
+                key = "<=%s" % bound
+                break
+        else:
+            key = ">%s" % bounds[-1]
+        histogram[key] = histogram.get(key, 0) + 1
+    return histogram
+
+
 class MultiportStress(Test):
     '''
     To perform IO stress on multiple ports on a NIC adapter
@@ -49,6 +69,8 @@ class MultiportStress(Test):
             if self.host_interface not in interfaces:
                 self.cancel("interface is not available")
         self.count = self.params.get("count", default="1000")
+        self.duration = self.params.get("duration", default="60")
+        self.iperf_port = self.params.get("iperf_port", default="5201")
 
     def multiport_ping(self, ping_option):
         '''
@@ -67,22 +89,141 @@ class MultiportStress(Test):
         for proc in parallel_procs:
             proc.wait()
         errors = []
-        for proc in parallel_procs:
+        stats = {}
+        for host, proc in zip(self.host_interfaces, parallel_procs):
             out_buf = proc.get_stdout()
             out_buf += proc.get_stderr()
+            stats[host] = self.ping_stats(out_buf)
             for val in out_buf.splitlines():
                 if 'packet loss' in val and ', 0% packet loss,' not in val:
                     errors.append(out_buf)
                     break
+        stats['aggregate'] = self.aggregate_stats(list(stats.values()))
+        for port, stat in sorted(stats.items()):
+            self.log.info("%s: rtt min/avg/max/mdev = %s/%s/%s/%s ms, "
+                          "%s%% loss, histogram %s", port, stat['min'],
+                          stat['avg'], stat['max'], stat['mdev'],
+                          stat['loss'], stat['histogram'])
+        self.whiteboard = json.dumps(stats)
         if errors:
             self.fail("\n".join(errors))
 
+    @staticmethod
+    def ping_stats(output):
+        '''
+        Parses ping output into rtt min/avg/max/mdev, loss % and a latency
+        histogram built from the per packet times, when ping printed them
+        '''
+        stats = {'transmitted': 0, 'received': 0, 'loss': 100.0,
+                 'min': None, 'avg': None, 'max': None, 'mdev': None}
+        obj = re.search(r"(\d+) packets transmitted, (\d+) received.* "
+                        r"([\d.]+)% packet loss", output)
+        if obj:
+            stats['transmitted'] = int(obj.group(1))
+            stats['received'] = int(obj.group(2))
+            stats['loss'] = float(obj.group(3))
+        obj = re.search(r"= ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+) ms", output)
+        if obj:
+            for key, val in zip(['min', 'avg', 'max', 'mdev'], obj.groups()):
+                stats[key] = float(val)
+        stats['histogram'] = latency_histogram(
+            [float(val) for val in re.findall(r"time=([\d.]+) ms", output)])
+        return stats
+
+    @staticmethod
+    def aggregate_stats(stats):
+        '''
+        Combines per port ping stats, weighting avg and mdev by the number
+        of replies received on each port
+        '''
+        replied = [stat for stat in stats if stat['received']
+                   and stat['avg'] is not None]
+        transmitted = sum([stat['transmitted'] for stat in stats])
+        received = sum([stat['received'] for stat in stats])
+        total = {'transmitted': transmitted, 'received': received,
+                 'loss': 100.0, 'min': None, 'avg': None, 'max': None,
+                 'mdev': None, 'histogram': {}}
+        if transmitted:
+            total['loss'] = round(100.0 * (transmitted - received) /
+                                  transmitted, 3)
+        for stat in stats:
+            for bucket, count in stat['histogram'].items():
+                total['histogram'][bucket] = \
+                    total['histogram'].get(bucket, 0) + count
+        if not replied:
+            return total
+        weight = sum([stat['received'] for stat in replied])
+        avg = sum([stat['avg'] * stat['received']
+                   for stat in replied]) / weight
+        # pooled deviation: E[x^2] over all replies minus the squared mean
+        square = sum([(stat['mdev'] ** 2 + stat['avg'] ** 2) *
+                      stat['received'] for stat in replied]) / weight
+        total['min'] = min([stat['min'] for stat in replied])
+        total['max'] = max([stat['max'] for stat in replied])
+        total['avg'] = round(avg, 3)
+        total['mdev'] = round(max(square - avg ** 2, 0) ** 0.5, 3)
+        return total
+
+    def iperf_run(self, pairs):
+        '''
+        Runs iperf3 clients for the given (interface, peer) pairs
+        concurrently and returns the received Mb/s per interface
+        '''
+        parallel_procs = []
+        for host, peer in pairs:
+            local_ip = netifaces.ifaddresses(host)[AF_INET][0]['addr']
+            cmd = "iperf3 -J -c %s -B %s -p %s -t %s" \
+                  % (peer, local_ip, self.iperf_port, self.duration)
+            obj = process.SubProcess(cmd, verbose=False, shell=True)
+            obj.start()
+            parallel_procs.append(obj)
+        tput = {}
+        for (host, peer), proc in zip(pairs, parallel_procs):
+            proc.wait()
+            try:
+                result = json.loads(proc.get_stdout())
+                bps = result['end']['sum_received']['bits_per_second']
+            except (ValueError, KeyError):
+                self.fail("iperf3 to %s over %s failed: %s"
+                          % (peer, host, proc.get_stderr()))
+            tput[host] = round(bps / 1000000.0, 2)
+        return tput
+
     def test_multiport_ping(self):
         self.multiport_ping('')
 
     def test_multiport_floodping(self):
         self.multiport_ping('-f')
 
+    def test_multiport_throughput(self):
+        '''
+        Measures iperf3 throughput of every port alone and then of all
+        ports together, reporting per port degradation under full load
+        '''
+        smm = SoftwareManager()
+        if not smm.check_installed('iperf3') and not smm.install('iperf3'):
+            self.cancel("Package iperf3 is needed to test")
+        pairs = list(zip(self.host_interfaces, self.peer_ips))
+        solo = {}
+        for pair in pairs:
+            solo.update(self.iperf_run([pair]))
+        loaded = self.iperf_run(pairs)
+        results = {}
+        for host, _ in pairs:
+            degradation = 0.0
+            if solo[host]:
+                degradation = round(100.0 * (solo[host] - loaded[host]) /
+                                    solo[host], 2)
+            results[host] = {'solo_mbps': solo[host],
+                             'loaded_mbps': loaded[host],
+                             'degradation': degradation}
+            self.log.info("%s: %s Mb/s alone, %s Mb/s with all ports busy "
+                          "(%s%% degradation)", host, solo[host],
+                          loaded[host], degradation)
+        results['aggregate'] = {'solo_mbps': sum(solo.values()),
+                                'loaded_mbps': sum(loaded.values())}
+        self.whiteboard = json.dumps(results)
+
 
 if __name__ == "__main__":
     main()
@@ -20,6 +20,10 @@ check the statistics of interface, test big ping
 test lro and gro and interface
 """
 
+import os
+import sys
+import re
+import json
 import time
 import netifaces
 
@@ -28,6 +32,10 @@ from avocado import Test
 from avocado.utils.software_manager import SoftwareManager
 from avocado.utils import process
 from avocado.utils import distro
+# helpers shared between tests live in lib/ at the top of the tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, os.pardir, 'lib'))
+from ssh_mux import ssh_mux_options  # noqa
 
 
 class NetDataTest(Test):
@@ -60,6 +68,11 @@ class NetDataTest(Test):
         self.mtu_list = mtu_list.split()
         self.interface = interface
         self.peer = self.params.get("peer_ip")
+        self.ssh = "ssh %s" % ssh_mux_options(
+            self.params.get("ssh_persist", default="600"))
+        self.mtu_perf = self.params.get("mtu_perf", default=True)
+        self.perf_duration = int(self.params.get("perf_duration", default=10))
+        self.iperf_port = self.params.get("iperf_port", default="5201")
         self.eth = "ethtool %s | grep 'Link detected:'" % self.interface
         self.eth_state = process.system_output(self.eth, shell=True)
 
@@ -87,7 +100,7 @@ class NetDataTest(Test):
         check with different maximum transfer unit values
         '''
         cmd = "ip addr show  | grep %s | grep -oE '[^ ]+$'" % self.peer
-        cmd = "ssh %s \"%s\"" % (self.peer, cmd)
+        cmd = "%s %s \"%s\"" % (self.ssh, self.peer, cmd)
         errors = []
         try:
             peer_interface = process.system_output(cmd, shell=True).strip()
@@ -98,14 +111,29 @@ class NetDataTest(Test):
                                            shell=True).split()[4]
         except process.CmdError:
             self.fail("failed to get mtu value of %s" % self.interface)
+        results = {}
+        if self.mtu_perf:
+            smm = SoftwareManager()
+            if not smm.check_installed("iperf3") and \
+                    not smm.install("iperf3"):
+                self.log.info("iperf3 package is not available, skipping "
+                              "throughput per mtu")
+                self.mtu_perf = False
+        if self.mtu_perf:
+            cmd = "%s %s \"iperf3 -s -D -p %s\"" % (self.ssh, self.peer,
+                                                    self.iperf_port)
+            if process.system(cmd, shell=True, ignore_status=True) != 0:
+                self.log.info("unable to start iperf3 in peer, skipping "
+                              "throughput per mtu")
+                self.mtu_perf = False
         for mtu in self.mtu_list:
             mtu_set = False
             self.log.info("trying with mtu %s", mtu)
             # ping the peer machine with different maximum transfers unit sizes
             # and finally set maximum transfer unit size to 1500 Bytes
-            cmd = "ssh %s \"ip link set %s mtu %s\"" % (self.peer,
-                                                        peer_interface,
-                                                        mtu)
+            cmd = "%s %s \"ip link set %s mtu %s\"" % (self.ssh, self.peer,
+                                                       peer_interface,
+                                                       mtu)
             try:
                 process.system(cmd, shell=True)
             except process.CmdError:
@@ -126,6 +154,8 @@ class NetDataTest(Test):
                 ret = process.system(cmd_ping, shell=True, ignore_status=True)
                 if ret != 0:
                     errors.append(str(int(mtu) + 28))
+                elif self.mtu_perf:
+                    results[mtu + 28] = self.mtu_perf_run(mtu + 28)
             else:
                 errors.append(mtu)
             con_cmd = "ip link set %s mtu %s" % (self.interface, mtuval)
@@ -133,18 +163,71 @@ class NetDataTest(Test):
                 process.system(con_cmd, shell=True)
             except process.CmdError:
                 self.log.debug("setting original mtu value in host failed")
-            cmd = "ssh %s \"ip link set %s mtu %s\"" % (self.peer,
-                                                        peer_interface,
-                                                        mtuval)
+            cmd = "%s %s \"ip link set %s mtu %s\"" % (self.ssh, self.peer,
+                                                       peer_interface,
+                                                       mtuval)
             try:
                 process.system(cmd, shell=True)
             except process.CmdError:
                 self.log.debug("setting original mtu value in peer failed")
             time.sleep(10)
 
+        if self.mtu_perf:
+            cmd = "%s %s \"pkill -f 'iperf3 -s -D -p %s'\"" \
+                  % (self.ssh, self.peer, self.iperf_port)
+            process.system(cmd, shell=True, ignore_status=True)
+            self.whiteboard = json.dumps(results)
         if errors:
             self.fail("bigping test failed for %s" % " ".join(errors))
 
+    def read_statistics(self):
+        '''
+        reads the interface counters from sysfs
+        '''
+        stats = {}
+        for name in ['rx_packets', 'tx_packets', 'rx_bytes', 'tx_bytes',
+                     'rx_errors', 'tx_errors', 'rx_dropped', 'tx_dropped']:
+            with open("/sys/class/net/%s/statistics/%s"
+                      % (self.interface, name)) as stat_file:
+                stats[name] = int(stat_file.read())
+        return stats
+
+    def mtu_perf_run(self, mtu):
+        '''
+        runs a bulk TCP transfer and a request/response (ping) test at
+        the current mtu, reports throughput, pps and errors/drops from the
+        interface counter deltas, and the request/response latency
+        '''
+        before = self.read_statistics()
+        start = time.time()
+        cmd = "iperf3 -J -c %s -p %s -t %s" % (self.peer, self.iperf_port,
+                                               self.perf_duration)
+        output = process.system_output(cmd, shell=True, ignore_status=True)
+        elapsed = time.time() - start
+        after = self.read_statistics()
+        delta = dict([(name, after[name] - before[name]) for name in after])
+        result = {'mbps': None,
+                  'rx_pps': int(delta['rx_packets'] / elapsed),
+                  'tx_pps': int(delta['tx_packets'] / elapsed),
+                  'errors': delta['rx_errors'] + delta['tx_errors'],
+                  'drops': delta['rx_dropped'] + delta['tx_dropped'],
+                  'rr_avg_ms': None}
+        try:
+            bps = json.loads(output)['end']['sum_received']['bits_per_second']
+            result['mbps'] = round(bps / 1000000.0, 2)
+        except (ValueError, KeyError):
+            self.log.info("bulk transfer at mtu %s failed", mtu)
+        cmd = "ping -q -i 0.01 -c 100 -s %s %s" % (mtu - 28, self.peer)
+        output = process.system_output(cmd, shell=True, ignore_status=True)
+        obj = re.search(r"= [\d.]+/([\d.]+)/", output)
+        if obj:
+            result['rr_avg_ms'] = float(obj.group(1))
+        self.log.info("mtu %s: %s Mb/s, rx %s pps, tx %s pps, %s errors, "
+                      "%s drops, rr avg %s ms", mtu, result['mbps'],
+                      result['rx_pps'], result['tx_pps'], result['errors'],
+                      result['drops'], result['rr_avg_ms'])
+        return result
+
     def testgro(self):
         '''
         check gro is enabled or not
@@ -226,6 +309,8 @@ class NetDataTest(Test):
          set the intial state
         '''
         self.log.info('setting intial state')
+        process.system("%s -O exit %s" % (self.ssh, self.peer), shell=True,
+                       ignore_status=True)
         if 'yes' in self.eth_state:
             process.system("ifconfig %s up" % self.interface, shell=True)
         else:
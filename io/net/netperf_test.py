@@ -23,6 +23,7 @@ unidirectional throughput, and end-to-end latency.
 
 
 import os
+import sys
 import netifaces
 from avocado import main
 from avocado import Test
@@ -32,6 +33,10 @@ from avocado.utils import build
 from avocado.utils import archive
 from avocado.utils import process
 from avocado.utils.genio import read_file
+# helpers shared between tests live in lib/ at the top of the tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, os.pardir, 'lib'))
+from ssh_mux import ssh_mux_options  # noqa
 
 
 class Netperf(Test):
@@ -63,6 +68,9 @@ class Netperf(Test):
         if self.peer_ip == "":
             self.cancel("%s peer machine is not available" % self.peer_ip)
         self.peer_user = self.params.get("peer_user_name", default="root")
+        self.ssh_opts = ssh_mux_options(
+            self.params.get("ssh_persist", default="600"))
+        self.peer = "%s@%s" % (self.peer_user, self.peer_ip)
         self.timeout = self.params.get("TIMEOUT", default="600")
         self.netperf_run = str(self.params.get("NETSERVER_RUN", default=0))
         self.netperf = os.path.join(self.teststmpdir, 'netperf')
@@ -74,13 +82,14 @@ class Netperf(Test):
         self.version = "%s-%s" % ("netperf",
                                   os.path.basename(tarball.split('.zip')[0]))
         self.neperf = os.path.join(self.netperf, self.version)
-        cmd = "scp -r %s %s@%s:/tmp/" % (self.neperf, self.peer_user,
-                                         self.peer_ip)
+        if self.peer_run("true") != 0:
+            self.cancel("unable to connect to peer machine")
+        cmd = "scp %s -r %s %s:/tmp/" % (self.ssh_opts, self.neperf,
+                                         self.peer)
         if process.system(cmd, shell=True, ignore_status=True) != 0:
             self.cancel("unable to copy the netperf into peer machine")
         tmp = "cd /tmp/%s;./configure ppc64le;make" % self.version
-        cmd = "ssh %s@%s \"%s\"" % (self.peer_user, self.peer_ip, tmp)
-        if process.system(cmd, shell=True, ignore_status=True) != 0:
+        if self.peer_run(tmp) != 0:
             self.fail("test failed because command failed in peer machine")
         os.chdir(self.neperf)
         process.system('./configure ppc64le', shell=True)
@@ -92,19 +101,22 @@ class Netperf(Test):
         self.max = self.params.get("maximum_iterations", default="15")
         self.option = self.params.get("option", default='')
 
+    def peer_run(self, *cmds):
+        """
+        Runs the given commands on the peer in one round trip over the
+        shared ssh connection and returns the exit status
+        """
+        cmd = "ssh %s %s \"%s\"" % (self.ssh_opts, self.peer,
+                                    " && ".join(cmds))
+        return process.system(cmd, shell=True, ignore_status=True)
+
     def test(self):
         """
         netperf test
         """
         if self.netperf_run == '1':
-            tmp = "chmod 777 /tmp/%s/src" % self.version
-            cmd = "ssh %s@%s \"%s\"" % (self.peer_user, self.peer_ip, tmp)
-            if process.system(cmd, shell=True, ignore_status=True) != 0:
-                self.fail("test failed because netserver not available")
-            cmd = "ssh %s@%s \"/tmp/%s/src/netserver\"" % (self.peer_user,
-                                                           self.peer_ip,
-                                                           self.version)
-            if process.system(cmd, shell=True, ignore_status=True) != 0:
+            if self.peer_run("chmod 777 /tmp/%s/src" % self.version,
+                             "/tmp/%s/src/netserver" % self.version) != 0:
                 self.fail("test failed because netserver not available")
         speed = int(read_file("/sys/class/net/%s/speed" % self.iface))
         self.expected_tp = int(self.expected_tp) * speed / 100
@@ -131,8 +143,10 @@ class Netperf(Test):
         removing the data in peer machine
         """
         msg = "pkill netserver; rm -rf /tmp/%s" % self.version
-        cmd = "ssh %s@%s \"%s\"" % (self.peer_user, self.peer_ip, msg)
-        if process.system(cmd, shell=True, ignore_status=True) != 0:
+        status = self.peer_run(msg)
+        cmd = "ssh %s -O exit %s" % (self.ssh_opts, self.peer)
+        process.system(cmd, shell=True, ignore_status=True)
+        if status != 0:
             self.fail("test failed because peer sys not connected")
 
 
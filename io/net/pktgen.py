@@ -19,7 +19,11 @@
 # https://github.com/autotest/autotest-client-tests/tree/master/pktgen
 
 import os
+import re
+import glob
+import json
 import shutil
+import multiprocessing
 from avocado import Test
 from avocado import main
 from avocado.utils import process
@@ -41,6 +45,10 @@ class Pktgen(Test):
         self.dst_ip = self.params.get("peer_ip", default="")
         self.dst_mac = self.params.get("peer_mac", default="")
         self.results = self.params.get("resultsdir", default="/tmp/")
+        self.burst = self.params.get("burst", default="1")
+        self.threads = int(self.params.get("threads", default=0))
+        self.frame_sizes = str(self.params.get(
+            "frame_sizes", default="64 128 256 512 1024 1518 9000")).split()
         if not os.path.exists('/proc/net/pktgen'):
             process.system("modprobe pktgen", ignore_status=True, shell=True)
         if not os.path.exists('/proc/net/pktgen'):
@@ -77,6 +85,92 @@ class Pktgen(Test):
         output = os.path.join(self.results, self.eth)
         shutil.copyfile(self.pgdev, output)
 
+    def test_pktgen_multiqueue(self):
+        '''
+        Runs one pktgen device per TX queue, each on its own kpktgend
+        thread, for every frame size and reports pps and Mb/s per thread
+        and in total
+        '''
+        tx_queues = len(glob.glob('/sys/class/net/%s/queues/tx-*' % self.eth))
+        threads = self.threads or min(max(tx_queues, 1),
+                                      multiprocessing.cpu_count())
+        threads = min(threads, len(glob.glob('/proc/net/pktgen/kpktgend_*')))
+        with open('/sys/class/net/%s/mtu' % self.eth) as mtu_file:
+            mtu = int(mtu_file.read())
+        self.log.info("Running pktgen on %s with %d threads", self.eth,
+                      threads)
+        # make sure the single queue setup does not run alongside
+        self.pgdev = '/proc/net/pktgen/kpktgend_0'
+        self.pgset('rem_device_all')
+        results = {}
+        for frame_size in self.frame_sizes:
+            # pktgen pkt_size excludes the 4 byte FCS
+            pkt_size = int(frame_size) - 4
+            if pkt_size > mtu + 14:
+                self.log.info("Skipping frame size %s, above %s mtu %d",
+                              frame_size, self.eth, mtu)
+                continue
+            devices = self.setup_queue_devices(threads, pkt_size)
+            self.start_flag = True
+            self.pgdev = '/proc/net/pktgen/pgctrl'
+            self.pgset('start')
+            self.start_flag = False
+            results[frame_size] = self.parse_results(devices)
+            self.log.info("frame %s bytes: %s pps, %s Mb/s", frame_size,
+                          results[frame_size]['total']['pps'],
+                          results[frame_size]['total']['mbps'])
+            for thread in range(threads):
+                self.pgdev = '/proc/net/pktgen/kpktgend_%d' % thread
+                self.pgset('rem_device_all')
+        if not results:
+            self.cancel("No frame size fits in %s mtu %d" % (self.eth, mtu))
+        with open(os.path.join(self.outputdir, 'pktgen.json'), 'w') as f:
+            json.dump(results, f, indent=4)
+        self.whiteboard = json.dumps(results)
+
+    def setup_queue_devices(self, threads, pkt_size):
+        '''
+        Adds one <interface>@<queue> device to every kpktgend thread,
+        mapping it to its own TX queue
+        '''
+        devices = []
+        for thread in range(threads):
+            dev = "%s@%d" % (self.eth, thread)
+            self.pgdev = '/proc/net/pktgen/kpktgend_%d' % thread
+            self.pgset('rem_device_all')
+            self.pgset('add_device %s' % dev)
+            self.pgdev = '/proc/net/pktgen/%s' % dev
+            if self.clone_skb:
+                self.pgset('clone_skb %s' % self.count)
+            self.pgset('burst %s' % self.burst)
+            self.pgset('pkt_size %d' % pkt_size)
+            self.pgset('queue_map_min %d' % thread)
+            self.pgset('queue_map_max %d' % thread)
+            self.pgset('dst %s' % self.dst_ip)
+            self.pgset('dst_mac %s' % self.dst_mac)
+            self.pgset('count %s' % self.count)
+            devices.append(dev)
+        return devices
+
+    @staticmethod
+    def parse_results(devices):
+        '''
+        Parses pps and Mb/s from the Result line of every pktgen device
+        '''
+        pattern = re.compile(r"(\d+)pps (\d+)Mb/sec .*errors: (\d+)")
+        results = {'total': {'pps': 0, 'mbps': 0, 'errors': 0}}
+        for dev in devices:
+            with open('/proc/net/pktgen/%s' % dev) as dev_file:
+                obj = pattern.search(dev_file.read())
+            if not obj:
+                continue
+            pps, mbps, errors = [int(val) for val in obj.groups()]
+            results[dev] = {'pps': pps, 'mbps': mbps, 'errors': errors}
+            results['total']['pps'] += pps
+            results['total']['mbps'] += mbps
+            results['total']['errors'] += errors
+        return results
+
     def pgset(self, command):
         file_name = open(self.pgdev, 'w')
         file_name.write(command + '\n')
@@ -14,7 +14,10 @@
 # Author: Pridhiviraj Paidipeddi <ppaidipe@linux.vnet.ibm.com>
 # this script runs portbounce test on different ports of fc or fcoe switches.
 
+import os
 import re
+import sys
+import json
 import time
 import telnetlib
 
@@ -22,6 +25,10 @@ from avocado import Test
 from avocado import main
 from avocado.utils import process
 from avocado.utils import genio, pci
+# helpers shared between tests live in lib/ at the top of the tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, os.pardir, 'lib'))
+from latency import latency_summary  # noqa
 
 
 class CommandFailed(Exception):
@@ -48,6 +55,8 @@ class PortBounceTest(Test):
     :param sbt: short bounce time in seconds
     :param lbt: long bounce time in seconds
     :param count: Number of times test to run
+    :param link_timeout: seconds to wait for host port state change
+    :param poll_interval: seconds between host port state polls
     """
 
     def setUp(self):
@@ -69,6 +78,10 @@ class PortBounceTest(Test):
         self.sbt = int(self.params.get("sbt", '*', default=5))
         self.lbt = int(self.params.get("lbt", '*', default=250))
         self.count = int(self.params.get("count", '*', default="2"))
+        self.link_timeout = int(self.params.get("link_timeout", '*',
+                                                default=60))
+        self.poll_interval = float(self.params.get("poll_interval", '*',
+                                                   default=0.05))
         self.prompt = ">"
 
     def fc_login(self, ip, username, password):
@@ -113,7 +126,14 @@ class PortBounceTest(Test):
         else:
             test = self.porttoggle
         self.failure_list = {}
+        self.latencies = {'down': [], 'up': []}
         self.port_bounce(test)
+        report = {}
+        for key, samples in self.latencies.items():
+            report[key] = latency_summary(samples)
+            self.log.info("port %s detection latency (s): %s", key,
+                          report[key])
+        self.whiteboard = json.dumps(report)
         if self.failure_list:
             self.fail("Some ports failed in portbounce tests, details: %s",
                       self.failure_list)
@@ -146,7 +166,11 @@ class PortBounceTest(Test):
         except CommandFailed as cf:
             self.log.info("port disable failed for port(s) %s, details: %s",
                           test_ports, str(cf))
-        time.sleep(sleep_time)
+        elapsed = self.wait_for_host_state("Linkdown")
+        if elapsed is not None:
+            self.latencies['down'].append(elapsed)
+        # keep the port down for the rest of the bounce time
+        time.sleep(max(sleep_time - (elapsed or 0), 0))
         self.verify_port_disable(test_ports)
         self.verify_port_toggle_host("Linkdown")
 
@@ -157,7 +181,9 @@ class PortBounceTest(Test):
         except CommandFailed as cf:
             self.log.info("port enable failed for port %s, details: %s",
                           test_ports, str(cf))
-        time.sleep(5)
+        elapsed = self.wait_for_host_state("Online")
+        if elapsed is not None:
+            self.latencies['up'].append(elapsed)
         self.verify_port_enable(test_ports)
         self.verify_port_toggle_host("Online")
 
@@ -191,6 +217,36 @@ class PortBounceTest(Test):
                 msg = "Port %s is failed to enable" % port
                 self.failure_list[port] = msg
 
+    def host_state_paths(self):
+        """
+        Returns the sysfs port_state path of the fc_host of every bus
+        address
+        """
+        paths = []
+        for bus_id in self.pci_bus_addrs:
+            pci_class = pci.get_pci_class_name(bus_id)
+            intf = pci.get_interfaces_in_pci_address(bus_id, pci_class)[-1]
+            paths.append("/sys/class/fc_host/%s/port_state" % intf)
+        return paths
+
+    def wait_for_host_state(self, status):
+        """
+        Polls the host port states till all of them reach status and
+        returns the seconds it took, or None on timeout
+        """
+        # resolve the fc_hosts before polling, lspci lookups would skew
+        # the timing, only sysfs is read in the loop
+        paths = self.host_state_paths()
+        start = time.time()
+        while time.time() - start < self.link_timeout:
+            if all(genio.read_file(path).rstrip("\n") == status
+                   for path in paths):
+                return round(time.time() - start, 3)
+            time.sleep(self.poll_interval)
+        self.log.info("host ports did not reach %s in %s seconds",
+                      status, self.link_timeout)
+        return None
+
     def verify_port_toggle_host(self, status):
         """
         Verifies port enable/disable status change in host
@@ -22,6 +22,7 @@ Scp allows files to be copied to, from, or between different hosts.
 """
 
 import time
+import json
 import hashlib
 import netifaces
 from avocado import main
@@ -61,6 +62,13 @@ class ScpTest(Test):
         if self.peer == "":
             self.cancel("peer ip should specify in input")
         self.user = self.params.get("user_name", default="root")
+        self.file_sizes = str(self.params.get("file_sizes",
+                                              default="100 1000")).split()
+        self.ciphers = str(self.params.get(
+            "ciphers", default="aes128-ctr aes128-gcm@openssh.com "
+            "chacha20-poly1305@openssh.com")).split()
+        self.compression = str(self.params.get("compression",
+                                               default="no yes")).split()
 
     def test_ping(self):
         '''
@@ -89,26 +97,83 @@ class ScpTest(Test):
             self.fail("unable to ssh into peer machine")
         process.run("dd if=/dev/zero of=/tmp/tempfile bs=1024000000 count=1",
                     shell=True)
-        time.sleep(15)
-        md_val1 = hashlib.md5(open('/tmp/tempfile', 'rb').read()).hexdigest()
-        time.sleep(5)
+        md_val1 = self.md5sum('/tmp/tempfile')
         cmd = "timeout 600 scp /tmp/tempfile %s@%s:/tmp" %\
               (self.user, self.peer)
-        ret = process.system(cmd, shell=True, verbose=True, ignore_status=True)
-        time.sleep(15)
-        if ret != 0:
+        if self.timed_copy(cmd) is None:
             self.fail("unable to copy into peer machine")
         cmd = "timeout 600 scp %s@%s:/tmp/tempfile /tmp" %\
               (self.user, self.peer)
-        ret = process.system(cmd, shell=True, verbose=True, ignore_status=True)
-        time.sleep(15)
-        if ret != 0:
+        if self.timed_copy(cmd) is None:
             self.fail("unable to copy from peer machine")
-        md_val2 = hashlib.md5(open('/tmp/tempfile', 'rb').read()).hexdigest()
-        time.sleep(5)
+        md_val2 = self.md5sum('/tmp/tempfile')
         if md_val1 != md_val2:
             self.fail("Test Failed")
 
+    def test_scp_throughput(self):
+        '''
+        scp throughput in MB/s to and from peer for every
+        file size x cipher x compression
+        '''
+        supported = process.system_output("ssh -Q cipher", shell=True,
+                                          ignore_status=True).split()
+        ciphers = [cipher for cipher in self.ciphers if cipher in supported]
+        if not ciphers:
+            self.cancel("none of the ciphers %s are supported" % self.ciphers)
+        results = []
+        for size in self.file_sizes:
+            # random data, so that compression is not measured on zeroes
+            process.run("dd if=/dev/urandom of=/tmp/tempfile bs=1M count=%s"
+                        % size, shell=True)
+            md_val = self.md5sum('/tmp/tempfile')
+            for cipher in ciphers:
+                for comp in self.compression:
+                    opts = "-c %s -o Compression=%s" % (cipher, comp)
+                    cmd = "timeout 600 scp %s /tmp/tempfile %s@%s:/tmp" %\
+                          (opts, self.user, self.peer)
+                    upload = self.timed_copy(cmd)
+                    cmd = "timeout 600 scp %s %s@%s:/tmp/tempfile /tmp" %\
+                          (opts, self.user, self.peer)
+                    download = self.timed_copy(cmd)
+                    if upload is None or download is None:
+                        self.fail("scp with %s failed" % opts)
+                    result = {'size_mb': int(size), 'cipher': cipher,
+                              'compression': comp,
+                              'upload_mbps': round(int(size) / upload, 2),
+                              'download_mbps': round(int(size) / download,
+                                                     2)}
+                    self.log.info("%sMB %s compression=%s: upload %s MB/s,"
+                                  " download %s MB/s", size, cipher, comp,
+                                  result['upload_mbps'],
+                                  result['download_mbps'])
+                    results.append(result)
+            if self.md5sum('/tmp/tempfile') != md_val:
+                self.fail("checksum mismatch after copying %sMB" % size)
+        self.whiteboard = json.dumps(results)
+
+    def timed_copy(self, cmd):
+        '''
+        runs the copy command, returns the seconds it took or None on error
+        '''
+        start = time.time()
+        ret = process.system(cmd, shell=True, verbose=True, ignore_status=True)
+        elapsed = time.time() - start
+        if ret != 0:
+            return None
+        self.log.info("copy took %.2f s", elapsed)
+        return max(elapsed, 0.001)
+
+    @staticmethod
+    def md5sum(path, chunk_size=1048576):
+        '''
+        md5 of the file, read in bounded chunks
+        '''
+        md5 = hashlib.md5()
+        with open(path, 'rb') as data:
+            for chunk in iter(lambda: data.read(chunk_size), b''):
+                md5.update(chunk)
+        return md5.hexdigest()
+
     def tearDown(self):
         '''
         remove data both peer and host machine
@@ -19,6 +19,9 @@ Tcpdump Test.
 """
 
 import os
+import re
+import json
+import time
 import netifaces
 from avocado import Test
 from avocado import main
@@ -39,6 +42,14 @@ class TcpdumpTest(Test):
         self.count = self.params.get("count", default="500")
         self.peer_ip = self.params.get("peer_ip", default="")
         self.drop = self.params.get("drop_accepted", default="10")
+        self.snaplens = str(self.params.get("snaplens",
+                                            default="96 65535")).split()
+        self.buffer_sizes = str(self.params.get("buffer_sizes",
+                                                default="2048")).split()
+        self.rates = str(self.params.get("rates",
+                                         default="1000 10000")).split()
+        self.duration = int(self.params.get("duration", default=10))
+        self.pkt_size = self.params.get("pkt_size", default="56")
         # Check if interface exists in the system
         interfaces = netifaces.interfaces()
         if self.iface not in interfaces:
@@ -69,6 +80,78 @@ class TcpdumpTest(Test):
                 print line
         obj.stop()
 
+    def test_capture_perf(self):
+        """
+        Sweeps snaplen, capture buffer size and file versus /dev/null
+        output at controlled packet rates, and reports the highest rate
+        captured without kernel drops for every capture setup.
+        """
+        results = []
+        lossless = {}
+        for snaplen in self.snaplens:
+            for buf in self.buffer_sizes:
+                for output in ['file', 'null']:
+                    setup = "snaplen=%s buffer=%sKiB output=%s" \
+                            % (snaplen, buf, output)
+                    lossless[setup] = 0
+                    for rate in sorted(self.rates, key=int):
+                        stats = self.capture(snaplen, buf, output, rate)
+                        stats.update({'snaplen': int(snaplen),
+                                      'buffer_kib': int(buf),
+                                      'output': output, 'rate': int(rate)})
+                        results.append(stats)
+                        self.log.info("%s rate=%s pps: sent %s pps, "
+                                      "received %s, dropped %s", setup, rate,
+                                      stats['sent_pps'], stats['received'],
+                                      stats['dropped'])
+                        # ping falls behind the requested rate on slow
+                        # systems, so report the rate actually sent
+                        if stats['received'] and not stats['dropped']:
+                            lossless[setup] = max(lossless[setup],
+                                                  stats['sent_pps'])
+        for setup, rate in sorted(lossless.items()):
+            self.log.info("%s: max lossless rate %s pps", setup, rate)
+        self.whiteboard = json.dumps({'runs': results,
+                                      'max_lossless_rate': lossless})
+
+    def capture(self, snaplen, buf, output, rate):
+        """
+        Captures the ping stream of the given rate and returns the capture
+        counters tcpdump reports on exit, and the packet rate ping
+        actually sent.
+        """
+        if output == 'file':
+            dest = os.path.join(self.teststmpdir, 'capture.pcap')
+        else:
+            dest = '/dev/null'
+        cmd = "timeout -s INT %s tcpdump -i %s -n -s %s -B %s -w '%s' " \
+              "icmp and host %s" % (self.duration + 2, self.iface, snaplen,
+                                    buf, dest, self.peer_ip)
+        tcpdump = process.SubProcess(cmd, verbose=False, shell=True)
+        tcpdump.start()
+        # let tcpdump open the interface before the stream starts
+        time.sleep(1)
+        cmd = "ping -I %s %s -q -s %s -i %f -c %d -w %d" \
+              % (self.iface, self.peer_ip, self.pkt_size, 1.0 / int(rate),
+                 int(rate) * self.duration, self.duration)
+        ping = process.run(cmd, shell=True, ignore_status=True).stdout
+        tcpdump.wait()
+        if output == 'file' and os.path.exists(dest):
+            os.remove(dest)
+        stats = {'captured': 0, 'received': 0, 'dropped': 0, 'sent_pps': 0}
+        patterns = {'captured': r"(\d+) packets? captured",
+                    'received': r"(\d+) packets? received by filter",
+                    'dropped': r"(\d+) packets? dropped by kernel"}
+        for key, pattern in patterns.items():
+            obj = re.search(pattern, tcpdump.get_stderr())
+            if obj:
+                stats[key] = int(obj.group(1))
+        obj = re.search(r"(\d+) packets transmitted.*time (\d+)ms", ping)
+        if obj and int(obj.group(2)):
+            stats['sent_pps'] = int(int(obj.group(1)) * 1000 /
+                                    int(obj.group(2)))
+        return stats
+
 
 if __name__ == "__main__":
     main()
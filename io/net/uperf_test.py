@@ -21,6 +21,7 @@ workload profiles
 """
 
 import os
+import sys
 import netifaces
 from avocado import main
 from avocado import Test
@@ -30,6 +31,10 @@ from avocado.utils import build
 from avocado.utils import archive
 from avocado.utils import process
 from avocado.utils.genio import read_file
+# helpers shared between tests live in lib/ at the top of the tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, os.pardir, 'lib'))
+from ssh_mux import ssh_mux_options  # noqa
 
 
 class Uperf(Test):
@@ -59,24 +64,30 @@ class Uperf(Test):
         if self.peer_ip == "":
             self.cancel("%s peer machine is not available" % self.peer_ip)
         self.peer_user = self.params.get("peer_user_name", default="root")
+        self.ssh_opts = ssh_mux_options(
+            self.params.get("ssh_persist", default="600"))
+        self.peer = "%s@%s" % (self.peer_user, self.peer_ip)
         uperf_download = self.params.get("uperf_download", default="https:"
                                          "//github.com/uperf/uperf/"
                                          "archive/master.zip")
         tarball = self.fetch_asset(uperf_download, expire='7d')
         archive.extract(tarball, self.teststmpdir)
         self.uperf_dir = os.path.join(self.teststmpdir, "uperf-master")
-        cmd = "scp -r %s %s@%s:/tmp" % (self.uperf_dir, self.peer_user,
-                                        self.peer_ip)
+        cmd = "ssh %s %s true" % (self.ssh_opts, self.peer)
+        if process.system(cmd, shell=True, ignore_status=True) != 0:
+            self.cancel("unable to connect to peer machine")
+        cmd = "scp %s -r %s %s:/tmp" % (self.ssh_opts, self.uperf_dir,
+                                        self.peer)
         if process.system(cmd, shell=True, ignore_status=True) != 0:
             self.cancel("unable to copy the uperf into peer machine")
-        cmd = "ssh %s@%s \"cd /tmp/uperf-master;./configure ppc64le;make\""\
-              % (self.peer_user, self.peer_ip)
+        cmd = "ssh %s %s \"cd /tmp/uperf-master;./configure ppc64le;make\""\
+              % (self.ssh_opts, self.peer)
         if process.system(cmd, ignore_status=True, shell=True, sudo=True):
             self.cancel("Unable to compile Uperf into peer machine")
         self.uperf_run = str(self.params.get("UPERF_SERVER_RUN", default=0))
         if self.uperf_run == '1':
-            cmd = "ssh %s@%s \"cd /tmp/uperf-master/src;./uperf -s\""\
-                  % (self.peer_user, self.peer_ip)
+            cmd = "ssh %s %s \"cd /tmp/uperf-master/src;./uperf -s\""\
+                  % (self.ssh_opts, self.peer)
             obj = process.SubProcess(cmd, verbose=False, shell=True)
             obj.start()
         os.chdir(self.uperf_dir)
@@ -116,9 +127,12 @@ class Uperf(Test):
         """
         Killing Uperf process in peer machine
         """
-        cmd = "ssh %s@%s \"pkill uperf; rm -rf /tmp/uperf-master\""\
-              % (self.peer_user, self.peer_ip)
-        if process.system(cmd, shell=True, ignore_status=True):
+        cmd = "ssh %s %s \"pkill uperf; rm -rf /tmp/uperf-master\""\
+              % (self.ssh_opts, self.peer)
+        status = process.system(cmd, shell=True, ignore_status=True)
+        cmd = "ssh %s -O exit %s" % (self.ssh_opts, self.peer)
+        process.system(cmd, shell=True, ignore_status=True)
+        if status:
             self.fail("Either the ssh to peer machine machine\
                        failed or uperf process was not killed")
 
@@ -14,6 +14,10 @@
 # Author: Pridhiviraj Paidipeddi <ppaidipe@linux.vnet.ibm.com>
 # VLAN Testcase
 
+import os
+import re
+import sys
+import json
 import time
 import telnetlib
 try:
@@ -25,6 +29,14 @@ from avocado import Test
 from avocado import main
 from avocado.utils import process
 from avocado.utils.process import CmdError
+# helpers shared between tests live in lib/ at the top of the tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, os.pardir, 'lib'))
+from latency import latency_summary  # noqa
+
+
+# Echoed after every remote command, followed by its exit status
+RC_MARKER = "__AVOCADO_RC__"
 
 
 class CommandFailed(Exception):
@@ -53,6 +65,9 @@ class VlanTest(Test):
     :param peer_user: Userid of the peer
     :param peer_password: Password of the peer to ssh into
     :param netmask: netmask of the test N/W Interfaces
+    :param count: number of link flaps in test_link_flap
+    :param link_timeout: seconds to wait for a link state change
+    :param poll_interval: seconds between link state polls
     """
 
     def setUp(self):
@@ -78,6 +93,11 @@ class VlanTest(Test):
         self.peer_password = self.params.get("peer_password", '*',
                                              default=None)
         self.cidr_value = self.params.get("cidr_value", '*', default=None)
+        self.count = int(self.params.get("count", '*', default=5))
+        self.link_timeout = int(self.params.get("link_timeout", '*',
+                                                default=60))
+        self.poll_interval = float(self.params.get("poll_interval", '*',
+                                                   default=0.01))
         self.prompt = ">"
 
     def switch_login(self, ip, username, password):
@@ -147,20 +167,45 @@ class VlanTest(Test):
         '''
         SSH Run command method for running commands on remote server
         '''
-        self.log.info("Running the command on peer lpar %s", command)
+        return self.run_peer_commands([command], timeout)[0]
+
+    def run_peer_commands(self, commands, timeout=300):
+        '''
+        Runs a batch of commands on remote server in a single round trip.
+        Each command is followed by a marker carrying its exit status, so
+        output and status of every command come back in one response.
+        The batch stops at the first command that fails and raises
+        CommandFailed for it, else returns the output of every command
+        in order
+        '''
+        for command in commands:
+            self.log.info("Running the command on peer lpar %s", command)
         if not hasattr(self, 'pxssh'):
             self.fail("SSH Console setup is not yet done")
         con = self.pxssh
-        con.sendline(command)
+        # commands after the first failing one are not run
+        con.sendline(" && ".join(["{ %s; rc=$?; echo %s$rc; test $rc = 0; }"
+                                  % (command, RC_MARKER)
+                                  for command in commands]))
         con.expect("\n")  # from us
         con.expect(con.PROMPT, timeout=timeout)
-        output = con.before.splitlines()
-        con.sendline("echo $?")
-        con.prompt(timeout)
-        exitcode = int(''.join(con.before.splitlines()[1:]))
-        if exitcode != 0:
-            raise CommandFailed(command, output, exitcode)
-        return output
+        outputs = []
+        output = []
+        for line in con.before.splitlines():
+            obj = re.search(r"%s(\d+)$" % RC_MARKER, line)
+            if not obj:
+                output.append(line)
+                continue
+            if line[:obj.start()]:
+                output.append(line[:obj.start()])
+            exitcode = int(obj.group(1))
+            if exitcode != 0:
+                raise CommandFailed(commands[len(outputs)], output, exitcode)
+            outputs.append(output)
+            output = []
+        if len(outputs) != len(commands):
+            raise CommandFailed(commands[len(outputs)], output, -1)
+        return outputs
 
     def run_host_command(self, cmd):
         """
@@ -247,6 +292,78 @@ class VlanTest(Test):
             self.fail("Ping test failed for vlan %s in peer" % self.vlan_num)
         self.log.info("Ping test passed for vlan %s in peer" % self.vlan_num)
 
+    def test_link_flap(self):
+        """
+        Scenario 4: Keep both in default VLAN 1, shut and re-enable the
+                    host switch port count times, and measure the time
+                    from port shutdown to host link down, from port
+                    enable to host link up, and from host link up to the
+                    first ping reply from peer.
+        """
+        self.vlan_port_conf("1", "1")
+        latencies = {'link_down': [], 'link_up': [], 'first_packet': []}
+        for i in range(self.count):
+            self.run_switch_command("interface port %s" % self.host_port)
+            self.run_switch_command("shutdown")
+            start = time.time()
+            changed = self.wait_for_link(False)
+            if changed is None:
+                self.run_switch_command("no shutdown")
+                self.run_switch_command("exit")
+                self.fail("link of %s did not go down" % self.host_intf)
+            latencies['link_down'].append(round(changed - start, 3))
+            self.run_switch_command("no shutdown")
+            start = time.time()
+            self.run_switch_command("exit")
+            changed = self.wait_for_link(True)
+            if changed is None:
+                self.fail("link of %s did not come up" % self.host_intf)
+            latencies['link_up'].append(round(changed - start, 3))
+            cmd = "ping -I %s -c 1 -i 0.01 -w %s %s" \
+                  % (self.host_intf, self.link_timeout,
+                     self.ip_dic[self.peer_intf])
+            if process.system(cmd, sudo=True, shell=True,
+                              ignore_status=True) != 0:
+                self.fail("no ping reply after link flap %s" % (i + 1))
+            latencies['first_packet'].append(round(time.time() - changed,
+                                                   3))
+            self.log.info("link flap %s: down %ss, up %ss, first packet %ss",
+                          i + 1, latencies['link_down'][-1],
+                          latencies['link_up'][-1],
+                          latencies['first_packet'][-1])
+        report = {}
+        for key, samples in latencies.items():
+            report[key] = latency_summary(samples)
+            self.log.info("%s latency (s): %s", key, report[key])
+        self.whiteboard = json.dumps(report)
+
+    def link_state(self):
+        """
+        Returns True if the host interface has carrier and is up
+        """
+        path = "/sys/class/net/%s/" % self.host_intf
+        try:
+            with open(path + "carrier") as carrier_file:
+                carrier = carrier_file.read().strip() == "1"
+        except IOError:
+            # carrier is not readable while the interface is down
+            carrier = False
+        with open(path + "operstate") as operstate_file:
+            operstate = operstate_file.read().strip()
+        return carrier and operstate == "up"
+
+    def wait_for_link(self, state):
+        """
+        Polls the host interface till its link state is state and
+        returns the time it changed, or None on timeout
+        """
+        end = time.time() + self.link_timeout
+        while time.time() < end:
+            if self.link_state() == state:
+                return time.time()
+            time.sleep(self.poll_interval)
+        return None
+
     def vlan_port_conf(self, host_vlan, peer_vlan):
         """
         Set both host & peer interface ports with corresponding
@@ -318,17 +435,14 @@ class VlanTest(Test):
         Vlan configuration on Peer
         """
         ip = self.ip_dic[self.peer_intf]
-        self.run_peer_command("ip addr flush dev %s" % self.peer_intf)
-        cmd = "ip link add link %s name %s.%s type vlan id %s" \
-              % (self.peer_intf, self.peer_intf, vlan_num, vlan_num)
-        self.run_peer_command(cmd)
-        cmd = "ip addr add %s/%s dev %s.%s" \
-              % (ip, self.cidr_value, self.peer_intf, vlan_num)
-        self.run_peer_command(cmd)
-        self.run_peer_command("ip link set %s.%s up" % (self.peer_intf,
-                                                        vlan_num))
-        cmd = "ifconfig %s.%s" % (self.peer_intf, vlan_num)
-        self.run_peer_command(cmd)
+        vlan_intf = "%s.%s" % (self.peer_intf, vlan_num)
+        cmds = ["ip addr flush dev %s" % self.peer_intf,
+                "ip link add link %s name %s type vlan id %s"
+                % (self.peer_intf, vlan_intf, vlan_num),
+                "ip addr add %s/%s dev %s" % (ip, self.cidr_value, vlan_intf),
+                "ip link set %s up" % vlan_intf,
+                "ifconfig %s" % vlan_intf]
+        self.run_peer_commands(cmds)
 
     def restore_host_intf(self):
         """
@@ -343,10 +457,10 @@ class VlanTest(Test):
         """
         Restore peer interfaces
         """
-        cmd = "ip link delete %s.%s" % (self.peer_intf, self.vlan_num)
-        self.run_peer_command(cmd)
-        self.run_peer_command("ifdown %s" % self.peer_intf)
-        self.run_peer_command("ifup %s" % self.peer_intf)
+        cmds = ["ip link delete %s.%s" % (self.peer_intf, self.vlan_num),
+                "ifdown %s" % self.peer_intf,
+                "ifup %s" % self.peer_intf]
+        self.run_peer_commands(cmds)
 
     def tearDown(self):
         """
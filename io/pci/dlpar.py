@@ -16,6 +16,7 @@
 # Author: Venkat Rao B <vrbagal1@linux.vnet.ibm.com>
 
 import os
+import re
 import shutil
 try:
     import pxssh
@@ -30,6 +31,10 @@ from avocado.utils.software_manager import SoftwareManager
 from avocado.utils.process import CmdError
 
 
+# Echoed after every remote command, followed by its exit status
+RC_MARKER = "__AVOCADO_RC__"
+
+
 class CommandFailed(Exception):
     def __init__(self, command, output, exitcode):
         self.command = command
@@ -120,18 +125,33 @@ class DlparPci(Test):
         p.prompt(timeout=60)
         self.pxssh = p
 
-    def run_command(self, command, timeout=300):
+    def run_command(self, command, timeout=300, ignore_status=False):
         '''
-        SSH Run command method for running commands on remote server
+        SSH Run command method for running commands on remote server,
+        raises CommandFailed on a non-zero exit status unless
+        ignore_status is set, and always when no exit status came back
         '''
         self.log.info("Running the command on hmc %s", command)
         c = self.pxssh
-        c.sendline(command)
+        # exit status comes back in the same response, framed by a marker,
+        # instead of costing a second "echo $?" round trip
+        c.sendline("%s; echo %s$?" % (command, RC_MARKER))
         c.expect("\n")  # from us
         c.expect(c.PROMPT, timeout=timeout)
-        output = c.before.splitlines()
-        c.sendline("echo $?")
-        c.prompt(timeout)
+        output = []
+        exitcode = None
+        for line in c.before.splitlines():
+            obj = re.search(r"%s(\d+)$" % RC_MARKER, line)
+            if obj:
+                exitcode = int(obj.group(1))
+                if not line[:obj.start()]:
+                    continue
+                line = line[:obj.start()]
+            output.append(line)
+        if exitcode is None:
+            raise CommandFailed(command, output, -1)
+        if exitcode and not ignore_status:
+            raise CommandFailed(command, output, exitcode)
         return output
 
     def test(self):
@@ -225,12 +245,9 @@ class DlparPci(Test):
         cmd = 'lshwres -r io -m %s \
                --rsubtype slot --filter lpar_names= %s \
                | grep -i %s' % (server, lpar, drc_index)
-        try:
-            cmd = self.run_command(cmd)
-        except CommandFailed as cf:
-            self.log.debug(str(cf))
-            self.fail("lshwres operation failed ")
-        return cmd
+        # grep exits 1 when the drc is not listed, which is expected
+        # after a remove or a move
+        return self.run_command(cmd, ignore_status=True)
 
     def changehwres(self, server, operation, lpar_id, lpar, drc_index, msg):
         if operation == 'm':
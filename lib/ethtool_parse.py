@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+#
+# Copyright: 2017 IBM
+#
+
+"""
+Parser for the 'key: value' output of ethtool queries
+"""
+
+
+def parse_ethtool(output):
+    """
+    Parses 'key: value' lines of ethtool output into a dict. A key with
+    no value starts a nested dict when the lines after it are indented
+    or when it is a multi-word header at the same level (e.g. 'Pre-set
+    maximums:'), otherwise its value is '' (e.g. 'firmware-version:').
+    Titles like 'Ring parameters for eth0:' are skipped.
+    """
+    result = {}
+    section = result
+    indent = None
+    lines = [line for line in output.splitlines() if ':' in line]
+    for index, line in enumerate(lines):
+        key, value = line.split(':', 1)
+        depth = len(key) - len(key.lstrip())
+        key = key.strip()
+        value = value.strip()
+        if indent is not None and depth < indent:
+            section = result
+            indent = None
+        if value:
+            section[key] = value
+            continue
+        if ' for ' in key:
+            section = result
+            indent = None
+            continue
+        following = lines[index + 1] if index + 1 < len(lines) else ''
+        next_depth = len(following) - len(following.lstrip())
+        if following and next_depth > depth:
+            section = result.setdefault(key, {})
+            indent = next_depth
+        elif ' ' in key and depth == 0:
+            section = result.setdefault(key, {})
+            indent = None
+        else:
+            section[key] = ''
+    return result
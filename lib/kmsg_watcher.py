@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+#
+# Copyright: 2017 IBM
+#
+
+"""
+Background /dev/kmsg watcher shared by the tests checking the kernel log
+"""
+
+import os
+import re
+import errno
+import threading
+
+
+class KmsgWatcher(threading.Thread):
+
+    """
+    Tails /dev/kmsg in background from the sequence number it was created
+    at, and keeps the records matching any of the patterns, so errors can
+    be checked after every step without reading or clearing the whole
+    kernel log. flags are re flags for the patterns, e.g. re.I
+    """
+
+    def __init__(self, patterns, level=7, interval=0.5, flags=0):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.regex = re.compile("|".join([re.escape(pattern)
+                                          for pattern in patterns]), flags)
+        self.level = level
+        self.interval = interval
+        self.seq = -1
+        self.hits = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.fd = os.open("/dev/kmsg", os.O_RDONLY | os.O_NONBLOCK)
+        os.lseek(self.fd, 0, os.SEEK_END)
+
+    def poll(self):
+        """
+        Reads the records logged since the last poll
+        """
+        with self.lock:
+            while True:
+                try:
+                    record = os.read(self.fd, 8192)
+                except OSError as err:
+                    if err.errno == errno.EPIPE:
+                        # oldest records got overwritten, go on reading
+                        continue
+                    break
+                if not record:
+                    break
+                header, _, message = record.decode('utf-8',
+                                                   'replace').partition(';')
+                prio, seq, usec = header.split(',')[:3]
+                if int(seq) <= self.seq:
+                    continue
+                self.seq = int(seq)
+                message = message.split('\n')[0]
+                if int(prio) & 7 <= self.level and \
+                        self.regex.search(message):
+                    self.hits.append("[%12.6f] %s" % (int(usec) / 1000000.0,
+                                                      message))
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.poll()
+
+    def new_hits(self):
+        """
+        Returns the matching records logged since the last call
+        """
+        self.poll()
+        with self.lock:
+            hits, self.hits = self.hits, []
+        return hits
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        os.close(self.fd)
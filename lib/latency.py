@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+#
+# Copyright: 2017 IBM
+#
+
+"""
+Latency distribution summary shared by the latency measuring tests
+"""
+
+import math
+
+
+def latency_summary(samples, scale=1):
+    """
+    Returns count/min/avg/p90/max of the given latency samples, each
+    multiplied by scale (e.g. 1000 for seconds to ms). p90 is the
+    nearest-rank percentile, so with few samples it is the max rather
+    than the min.
+    """
+    if not samples:
+        return {}
+    samples = sorted(samples)
+    p90 = samples[int(math.ceil(0.9 * len(samples))) - 1]
+    return {'count': len(samples),
+            'min': round(samples[0] * scale, 3),
+            'avg': round(sum(samples) * float(scale) / len(samples), 3),
+            'p90': round(p90 * scale, 3),
+            'max': round(samples[-1] * scale, 3)}
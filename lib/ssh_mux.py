@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+#
+# Copyright: 2017 IBM
+#
+
+"""
+OpenSSH connection multiplexing options shared by the peer driven tests
+"""
+
+import os
+
+
+def ssh_mux_options(persist=600):
+    """
+    Returns the ssh/scp options that make every remote command and copy
+    of the test ride on one multiplexed connection, kept open for
+    persist idle seconds. The control socket path includes the PID, so
+    concurrent runs against the same peer do not share or close each
+    other's connection.
+    """
+    return "-o ControlMaster=auto -o ControlPersist=%s " \
+           "-o ControlPath=/tmp/avocado-ssh-%d-%%r@%%h:%%p" \
+           % (persist, os.getpid())
@@ -14,6 +14,7 @@
 # Author: Abdul Haleem <abdhalee@linux.vnet.ibm.com>
 
 import os
+import sys
 import glob
 import re
 import platform
@@ -23,6 +24,10 @@ from avocado import main
 from avocado.utils import process
 from avocado.utils import memory
 from avocado.utils.software_manager import SoftwareManager
+# helpers shared between tests live in lib/ at the top of the tree
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.pardir, 'lib'))
+from kmsg_watcher import KmsgWatcher  # noqa
 
 
 blocks_hotpluggable = []
@@ -64,10 +69,6 @@ def get_hotpluggable_blocks(path):
     return mem_blocks
 
 
-def collect_dmesg(object):
-    object.whiteboard = process.system_output("dmesg")
-
-
 class memstress(Test):
 
     '''
@@ -100,6 +101,8 @@ class memstress(Test):
         self.memratio = self.params.get('memratio', default=None)
         self.blocks_hotpluggable = get_hotpluggable_blocks(
             '%s/memory*' % mem_path)
+        self.kmsg = KmsgWatcher(errorlog, level=4)
+        self.kmsg.start()
 
     @staticmethod
     def hotunplug_all(blocks):
@@ -113,19 +116,8 @@ class memstress(Test):
             if not memory._check_memory_state(block):
                 online(block)
 
-    @staticmethod
-    def __clear_dmesg():
-        process.run("dmesg -c", sudo=True)
-
-    @staticmethod
-    def __error_check():
-        ERROR = []
-        logs = process.system_output("dmesg -Txl 1,2,3,4").splitlines()
-        for error in errorlog:
-            for log in logs:
-                if error in log:
-                    ERROR.append(log)
-        return "\n".join(ERROR)
+    def __error_check(self):
+        return "\n".join(self.kmsg.new_hits())
 
     @staticmethod
     def __is_auto_online():
@@ -155,12 +147,11 @@ class memstress(Test):
 
         for method in tests:
             self.log.info("\nTEST: %s\n", method)
-            self.__clear_dmesg()
             run_test = 'self.%s()' % method
             eval(run_test)
             msg = self.__error_check()
             if msg:
-                collect_dmesg()
+                self.whiteboard = msg
                 self.log.error('Test: %s. ERROR Message: %s', run_test, msg)
             self.log.info("\nEND: %s\n", method)
 
@@ -242,6 +233,10 @@ class memstress(Test):
             self.run_stress()
             self.hotplug_all(self.blocks_hotpluggable)
 
+    def tearDown(self):
+        if hasattr(self, 'kmsg'):
+            self.kmsg.stop()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+#
+# Copyright: 2017 IBM
+#
+
+"""
+Unit tests for the failover probe statistics of io/net/bonding.py
+"""
+
+import os
+import imp
+import unittest
+
+BASEDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    bonding = imp.load_source('bonding', os.path.join(BASEDIR, 'io', 'net',
+                                                      'bonding.py'))
+except ImportError:
+    bonding = None
+
+
+@unittest.skipIf(bonding is None, "avocado or netifaces is not available")
+class ProbeStats(unittest.TestCase):
+    '''
+    outage and recovery computed from (timestamp, seq) probe replies
+    '''
+
+    def setUp(self):
+        self.bond = bonding.Bonding.__new__(bonding.Bonding)
+        self.bond.probe_interval = 0.01
+
+    def replies(self, stamps):
+        # ping sends one probe every probe_interval from 0.005, so the
+        # seq follows from the send time and an outage leaves a hole
+        return [(stamp, int(round((stamp - 0.005) / 0.01)) + 1)
+                for stamp in stamps]
+
+    def test_hole_covers_window(self):
+        # replies every 10ms, none between 0.995 and 3.505 while the slave
+        # is down from 1.0 to 3.0
+        stamps = [0.005 + 0.01 * i for i in range(100)] + \
+                 [3.505 + 0.01 * i for i in range(100)]
+        stats = self.bond.probe_stats(self.replies(stamps), 1.0, 3.0)
+        self.assertAlmostEqual(stats['outage_ms'], 2500, places=0)
+        self.assertAlmostEqual(stats['recovery_ms'], 495, places=0)
+        # probes sent from 1.005 to 3.495 got no reply
+        self.assertEqual(stats['lost'], 250)
+        self.assertEqual(stats['reordered'], 0)
+
+    def test_hole_inside_window(self):
+        stamps = [0.005 + 0.01 * i for i in range(150)] + \
+                 [2.0 + 0.01 * i for i in range(200)]
+        stats = self.bond.probe_stats(self.replies(stamps), 1.0, 3.0)
+        self.assertAlmostEqual(stats['outage_ms'], 495, places=0)
+        self.assertAlmostEqual(stats['recovery_ms'], 0, places=0)
+
+    def test_reordered_replies(self):
+        replies = self.replies([0.005 + 0.01 * i for i in range(400)])
+        # replies of seq 150 and 300 overtaken by the next two replies
+        for index in [149, 299]:
+            replies[index:index + 3] = replies[index + 1:index + 3] + \
+                [replies[index]]
+        stats = self.bond.probe_stats(replies, 1.0, 3.0)
+        self.assertEqual(stats['reordered'], 2)
+        self.assertEqual(stats['lost'], 0)
+
+    def test_no_reply_after_event(self):
+        stamps = [0.005 + 0.01 * i for i in range(100)]
+        stats = self.bond.probe_stats(self.replies(stamps), 1.0, 3.0)
+        self.assertIsNone(stats['outage_ms'])
+        self.assertIsNone(stats['recovery_ms'])
+
+
+if __name__ == '__main__':
+    unittest.main()